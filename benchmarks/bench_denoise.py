@@ -0,0 +1,128 @@
+"""
+EdiScan - Benchmark du débruitage
+Temps de prétraitement et précision OCR de chaque mode de débruitage,
+sur des documents synthétiques à plusieurs niveaux de bruit
+
+Usage:
+    python benchmarks/bench_denoise.py
+    python benchmarks/bench_denoise.py --noise 0 4 12 --repeat 3 --no-ocr
+"""
+
+import argparse
+import difflib
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+from preprocessing import DENOISE_MODES, DOCUMENT_MODES, preprocess_image  # noqa: E402
+
+SAMPLE_LINES = [
+    'FACTURE N 2024-0173',
+    'Date: 12/03/2024',
+    'Client: Societe Dupont et Fils',
+    'Designation Quantite Prix',
+    'Ramette papier A4 10 45.90',
+    'Cartouche encre noire 3 87.60',
+    'Total TTC: 133.50 EUR',
+    'Merci pour votre confiance',
+]
+
+
+def make_document(width=1600, noise_sigma=0.0, seed=0):
+    """Générer un document (RGB) avec texte connu et bruit gaussien"""
+    line_height = 90
+    height = line_height * (len(SAMPLE_LINES) + 1)
+    img = np.full((height, width, 3), 245, dtype=np.uint8)
+
+    for i, line in enumerate(SAMPLE_LINES):
+        cv2.putText(img, line, (60, line_height * (i + 1)), cv2.FONT_HERSHEY_SIMPLEX, 1.6, (20, 20, 20), 3,
+                    cv2.LINE_AA)
+
+    if noise_sigma > 0:
+        rng = np.random.default_rng(seed)
+        noisy = img.astype(np.float32) + rng.normal(0, noise_sigma, img.shape)
+        img = np.clip(noisy, 0, 255).astype(np.uint8)
+    return img
+
+
+def text_accuracy(expected, found):
+    """Similarité caractère par caractère (0-100) entre texte attendu et extrait"""
+    expected = ' '.join(expected.split()).lower()
+    found = ' '.join(found.split()).lower()
+    return round(difflib.SequenceMatcher(None, expected, found).ratio() * 100, 1)
+
+
+def load_reader():
+    """Reader easyocr (None si les modèles ne sont pas disponibles)"""
+    try:
+        import easyocr
+        return easyocr.Reader(['fr', 'en'], gpu=False, model_storage_directory='models', verbose=False)
+    except Exception as e:
+        print(f"⚠️ OCR désactivé: {e}")
+        return None
+
+
+def run(noise_levels, modes, repeat, reader, document_mode='auto'):
+    results = []
+    expected = '\n'.join(SAMPLE_LINES)
+
+    for noise_sigma in noise_levels:
+        document = make_document(noise_sigma=noise_sigma)
+
+        for mode in modes:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                processed, info = preprocess_image(document, mode, document_mode)
+                timings.append((time.perf_counter() - start) * 1000)
+
+            row = {
+                'noise': noise_sigma,
+                'mode': mode,
+                'applied': info['denoise'],
+                'estimated_noise': info['noise_sigma'],
+                'preprocess_ms': round(float(np.median(timings)), 1),
+                'accuracy': None
+            }
+
+            if reader is not None:
+                detections = reader.readtext(processed, paragraph=False)
+                found = ' '.join(text for (_, text, _) in detections)
+                row['accuracy'] = text_accuracy(expected, found)
+
+            results.append(row)
+            print(f"bruit={noise_sigma:>5} mode={mode:<12} appliqué={info['denoise']:<12} "
+                  f"σ estimé={info['noise_sigma']:>6} temps={row['preprocess_ms']:>9} ms "
+                  f"précision={row['accuracy']}")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--noise', type=float, nargs='+', default=[0, 3, 8, 15, 25],
+                        help='Écarts-types du bruit gaussien ajouté')
+    parser.add_argument('--modes', nargs='+', default=list(DENOISE_MODES), choices=DENOISE_MODES)
+    parser.add_argument('--document-mode', default='auto', choices=DOCUMENT_MODES,
+                        help='Pipeline document (gris + binarisation)')
+    parser.add_argument('--repeat', type=int, default=3, help='Mesures par mode (médiane retenue)')
+    parser.add_argument('--no-ocr', action='store_true', help='Mesurer seulement le prétraitement')
+    parser.add_argument('--json', help='Écrire les résultats dans ce fichier')
+    args = parser.parse_args()
+
+    reader = None if args.no_ocr else load_reader()
+    results = run(args.noise, args.modes, args.repeat, reader, args.document_mode)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"📊 Résultats écrits dans {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+"""
+EdiScan - Benchmark du pipeline OCR
+Latence (p50/p95), débit et pic d'allocations de chaque étape du pipeline sur des
+documents synthétiques générés hors ligne (taille du texte, rotation, bruit,
+format de page), avec comparaison à une base de référence enregistrée
+
+Usage:
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --pages a4 a4_300dpi --rotations 0 5 90 --no-ocr
+    python benchmarks/bench_pipeline.py --json benchmarks/baseline.json
+    python benchmarks/bench_pipeline.py --baseline benchmarks/baseline.json --tolerance 15
+
+Avant les mesures, des pages droites (texte courant, majuscules, chiffres)
+doivent sortir de normalize_orientation sans rotation (code de sortie 1 sinon).
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+from bench_denoise import SAMPLE_LINES, load_reader, text_accuracy  # noqa: E402
+from detections import Detections  # noqa: E402
+from layout import format_text_output, sort_text_by_position  # noqa: E402
+from ocr_profiles import READTEXT_PROFILES  # noqa: E402
+from overlay import draw_boxes_on_image  # noqa: E402
+from preprocessing import normalize_orientation, preprocess_image  # noqa: E402
+
+# Formats de page (largeur, hauteur) en pixels
+PAGE_SIZES = {
+    'receipt': (600, 1600),
+    'a5': (1240, 1748),
+    'a4': (1654, 2339),
+    'a4_300dpi': (2480, 3508),
+}
+
+# Étapes mesurées, dans l'ordre du pipeline
+STAGES = ('orientation', 'preprocess', 'readtext_quick', 'readtext_full', 'sort_text', 'format_text', 'draw_boxes')
+OCR_STAGES = ('readtext_quick', 'readtext_full')
+
+# Contenus des pages: texte courant, tout en majuscules, chiffres seuls
+SAMPLE_NUMBERS = ('12,50', '2024', '0612', '18/03', '1 250', '7,5', '36', '100', '09', '4471')
+CONTENTS = ('mixed', 'upper', 'digits')
+
+PAGE_MARGIN = 60
+BACKGROUND = 245
+INK = 20
+PREVIEW_MAX_SIDE = 2000
+
+
+def make_document(page, text_scale=1.0, rotation=0.0, noise_sigma=0.0, seed=0, content='mixed'):
+    """Générer une page (RGB), ses détections attendues (mots) et son texte
+
+    Les mots sont posés ligne après ligne jusqu'au bas de la page puis la page
+    est tournée de `rotation` degrés (boîtes comprises) et bruitée.
+    """
+    width, height = PAGE_SIZES[page]
+    img = np.full((height, width, 3), BACKGROUND, dtype=np.uint8)
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    thickness = max(1, round(text_scale * 2))
+    (_, text_height), baseline = cv2.getTextSize('Ag', font, text_scale, thickness)
+    line_height = int((text_height + baseline) * 1.8)
+    space = cv2.getTextSize(' ', font, text_scale, thickness)[0][0]
+
+    rng = np.random.default_rng(seed)
+    if content == 'digits':
+        words = itertools.cycle(SAMPLE_NUMBERS)
+    else:
+        sample = ' '.join(SAMPLE_LINES)
+        words = itertools.cycle((sample.upper() if content == 'upper' else sample).split())
+    boxes, texts, lines = [], [], []
+    y = PAGE_MARGIN + text_height
+    while y + baseline < height - PAGE_MARGIN:
+        x = PAGE_MARGIN
+        line = []
+        while True:
+            word = next(words)
+            word_width = cv2.getTextSize(word, font, text_scale, thickness)[0][0]
+            if x + word_width > width - PAGE_MARGIN:
+                break
+            cv2.putText(img, word, (x, y), font, text_scale, (INK, INK, INK), thickness, cv2.LINE_AA)
+            boxes.append([[x, y - text_height], [x + word_width, y - text_height],
+                          [x + word_width, y + baseline], [x, y + baseline]])
+            texts.append(word)
+            line.append(word)
+            x += word_width + space
+        if not line:
+            break
+        lines.append(' '.join(line))
+        y += line_height
+
+    boxes = np.array(boxes, dtype=np.float64).reshape(-1, 4, 2)
+    if rotation:
+        # Rotation autour du centre, toile agrandie pour garder toute la page
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), rotation, 1.0)
+        cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+        new_width = int(height * sin + width * cos)
+        new_height = int(height * cos + width * sin)
+        matrix[0, 2] += new_width / 2 - width / 2
+        matrix[1, 2] += new_height / 2 - height / 2
+        img = cv2.warpAffine(img, matrix, (new_width, new_height), borderValue=(BACKGROUND,) * 3)
+        boxes = boxes @ matrix[:, :2].T + matrix[:, 2]
+
+    if noise_sigma > 0:
+        noisy = img.astype(np.float32) + rng.normal(0, noise_sigma, img.shape)
+        img = np.clip(noisy, 0, 255).astype(np.uint8)
+
+    confidences = rng.uniform(0.3, 1.0, len(texts))
+    detections = Detections.from_results(list(zip(boxes.tolist(), texts, confidences.tolist())))
+    return img, detections, '\n'.join(lines)
+
+
+def peak_rss_mb():
+    """Mémoire résidente max du processus depuis son démarrage (Mo), None hors Unix"""
+    if not RESOURCE_AVAILABLE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss: kilo-octets sous Linux, octets sous macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def traced(peak_alloc, stage, func, *args, **kwargs):
+    """Appel de chauffe (hors chronométrage): pic des allocations pendant l'appel (Mo)
+
+    tracemalloc suit les allocations Python et NumPy (sorties d'OpenCV
+    comprises), pas les tampons natifs internes d'OpenCV ou de torch.
+    """
+    tracemalloc.start()
+    try:
+        result = func(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    peak_alloc[stage] = max(peak_alloc.get(stage, 0.0), round(peak / (1024 * 1024), 1))
+    return result
+
+
+def timed(timings, stage, func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    timings[stage].append(time.perf_counter() - start)
+    return result
+
+
+def summarize(samples):
+    """Débit (appels/s), latence p50/p95 et moyenne (ms) d'une série de mesures (s)"""
+    samples = np.array(samples)
+    return {
+        'count': int(samples.size),
+        'throughput_per_s': round(float(samples.size / samples.sum()), 2) if samples.sum() > 0 else None,
+        'p50_ms': round(float(np.percentile(samples, 50)) * 1000, 2),
+        'p95_ms': round(float(np.percentile(samples, 95)) * 1000, 2),
+        'mean_ms': round(float(samples.mean()) * 1000, 2),
+    }
+
+
+def run(documents, repeat, reader, output_dir):
+    """Mesurer chaque étape sur chaque document (un appel tracé puis repeat appels chronométrés)"""
+    timings = {stage: [] for stage in STAGES}
+    accuracy = {stage: [] for stage in OCR_STAGES}
+    peak_alloc = {}
+    confirm = reader_confirms_upside_down(reader) if reader is not None else None
+
+    def measure(stage, func, *args, **kwargs):
+        result = traced(peak_alloc, stage, func, *args, **kwargs)
+        for _ in range(repeat):
+            timed(timings, stage, func, *args, **kwargs)
+        return result
+
+    for name, (image, truth, expected) in documents.items():
+        # Comme prepare_ocr_input: orientation puis prétraitement sans redressement
+        oriented, _, _ = measure('orientation', normalize_orientation, image, 'auto', confirm)
+        processed, _ = measure('preprocess', preprocess_image, oriented, deskew=False)
+
+        # Sans reader, les étapes suivantes utilisent les détections attendues
+        detections = truth
+        if reader is not None:
+            for stage, profile in zip(OCR_STAGES, ('quick', 'full')):
+                result = measure(stage, reader.readtext, processed, **READTEXT_PROFILES[profile])
+                detections = Detections.from_results(result)
+                found, _ = format_text_output(detections, sort_text_by_position(detections))
+                accuracy[stage].append(text_accuracy(expected, found))
+
+        sorted_lines = measure('sort_text', sort_text_by_position, detections)
+        measure('format_text', format_text_output, detections, sorted_lines)
+        output_path = os.path.join(output_dir, f"{name}.png")
+        measure('draw_boxes', draw_boxes_on_image, image, detections, output_path, PREVIEW_MAX_SIDE)
+
+        print(f"📄 {name:<28} {image.shape[1]}x{image.shape[0]} détections={len(detections):>5} "
+              f"prétraitement={np.median(timings['preprocess'][-repeat:]) * 1000:>8.1f} ms")
+
+    stages = {}
+    for stage in STAGES:
+        if not timings[stage]:
+            continue
+        stages[stage] = summarize(timings[stage])
+        stages[stage]['peak_alloc_mb'] = peak_alloc.get(stage)
+        if accuracy.get(stage):
+            stages[stage]['accuracy'] = round(float(np.mean(accuracy[stage])), 1)
+    return stages
+
+
+def reader_confirms_upside_down(reader):
+    """Confirmation du demi-tour dès que la bande de texte se lit mieux à 180°
+
+    Plus permissive que le seuil de l'application: une page droite qu'elle
+    laisse à l'endroit l'est aussi dans l'application.
+    """
+    def confirm(band):
+        scores = []
+        for candidate in (band, cv2.rotate(band, cv2.ROTATE_180)):
+            results = reader.readtext(candidate, **READTEXT_PROFILES['quick'])
+            scores.append(np.mean([confidence for (_, _, confidence) in results]) if results else 0.0)
+        return scores[1] > scores[0]
+    return confirm
+
+
+def check_orientation(pages, text_scales, reader):
+    """Pages droites (tous les contenus) qui ressortent tournées de normalize_orientation"""
+    confirm = reader_confirms_upside_down(reader) if reader is not None else None
+    errors = []
+    for page, text_scale, content in itertools.product(pages, text_scales, CONTENTS):
+        image, _, _ = make_document(page, text_scale, content=content)
+        _, info, _ = normalize_orientation(image, 'auto', confirm)
+        if info['rotation']:
+            errors.append(f"{page}-s{text_scale:g}-{content}: rotation {info['rotation']}°")
+    return errors
+
+
+def print_summary(stages):
+    print(f"\n{'étape':<16}{'n':>6}{'débit/s':>10}{'p50 ms':>11}{'p95 ms':>11}{'alloc Mo':>10}{'précision':>11}")
+    for stage, row in stages.items():
+        print(f"{stage:<16}{row['count']:>6}{row['throughput_per_s'] or '-':>10}{row['p50_ms']:>11}{row['p95_ms']:>11}"
+              f"{row['peak_alloc_mb']:>10}{row.get('accuracy', '-'):>11}")
+
+
+def compare(stages, baseline, tolerance):
+    """Écarts de p50/p95 et du pic d'allocations avec la base de référence; retourne les étapes en régression"""
+    regressions = []
+    keys = ('p50_ms', 'p95_ms', 'peak_alloc_mb')
+    print(f"\n{'étape':<16}{'p50 réf':>10}{'p50':>10}{'écart':>9}{'p95 réf':>10}{'p95':>10}{'écart':>9}"
+          f"{'alloc réf':>11}{'alloc':>8}{'écart':>9}")
+    for stage, row in stages.items():
+        reference = baseline['stages'].get(stage)
+        if reference is None:
+            continue
+        deltas = []
+        for key in keys:
+            # Base de référence antérieure au suivi des allocations: pas d'écart
+            deltas.append((row[key] - reference[key]) / reference[key] * 100 if reference.get(key) else 0.0)
+        regressed = any(delta > tolerance for delta in deltas)
+        if regressed:
+            regressions.append(stage)
+        print(f"{stage:<16}{reference['p50_ms']:>10}{row['p50_ms']:>10}{deltas[0]:>+8.1f}%"
+              f"{reference['p95_ms']:>10}{row['p95_ms']:>10}{deltas[1]:>+8.1f}%"
+              f"{reference.get('peak_alloc_mb', '-'):>11}{row['peak_alloc_mb']:>8}{deltas[2]:>+8.1f}%"
+              f"{'  ⚠️ régression' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', nargs='+', default=['receipt', 'a4'], choices=list(PAGE_SIZES))
+    parser.add_argument('--text-scales', type=float, nargs='+', default=[0.8, 1.6],
+                        help='Échelles de police (Hershey)')
+    parser.add_argument('--rotations', type=float, nargs='+', default=[0, 4], help='Rotations (degrés)')
+    parser.add_argument('--noise', type=float, nargs='+', default=[0, 10],
+                        help='Écarts-types du bruit gaussien ajouté')
+    parser.add_argument('--repeat', type=int, default=3, help='Mesures par étape et par document')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-ocr', action='store_true', help='Sans reader (détections attendues pour la suite)')
+    parser.add_argument('--json', help='Écrire les résultats dans ce fichier (nouvelle base de référence)')
+    parser.add_argument('--baseline', help='Comparer à cette base de référence (code de sortie 1 si régression)')
+    parser.add_argument('--tolerance', type=float, default=10.0, help='Régression au-delà de cet écart (%%)')
+    args = parser.parse_args()
+
+    documents = {}
+    grid = itertools.product(args.pages, args.text_scales, args.rotations, args.noise)
+    for index, (page, text_scale, rotation, noise_sigma) in enumerate(grid):
+        name = f"{page}-s{text_scale:g}-r{rotation:g}-n{noise_sigma:g}"
+        documents[name] = make_document(page, text_scale, rotation, noise_sigma, seed=args.seed + index)
+
+    reader = None if args.no_ocr else load_reader()
+    orientation_errors = check_orientation(args.pages, args.text_scales, reader)
+    for error in orientation_errors:
+        print(f"❌ Page droite tournée: {error}")
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        stages = run(documents, args.repeat, reader, output_dir)
+    print_summary(stages)
+
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+        },
+        'config': {
+            'pages': args.pages,
+            'text_scales': args.text_scales,
+            'rotations': args.rotations,
+            'noise': args.noise,
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'ocr': reader is not None,
+        },
+        'stages': stages,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('config') != results['config']:
+            print("⚠️ Configuration différente de la base de référence: comparaison indicative")
+        regressions = compare(stages, baseline, args.tolerance)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"📊 Résultats écrits dans {args.json}")
+
+    if regressions:
+        print(f"❌ Régression (> {args.tolerance:g}%): {', '.join(regressions)}")
+    if regressions or orientation_errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,8 @@
-from flask import Flask, render_template, request, redirect, url_for, send_from_directory, jsonify
-import easyocr
+from flask import Flask, render_template, request, redirect, url_for, send_from_directory, jsonify, abort, g
 import cv2
 import numpy as np
 import os
+import re
 import json
 import sqlite3
 import threading
@@ -10,19 +10,126 @@ import time
 import hashlib
 from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
-from PIL import Image, ImageEnhance, ImageFilter
 import uuid
 
+import db
+import profiling
+from detections import Detections
+from jobs import (
+    JobWorkerPool, init_jobs_table, enqueue_job, get_job, get_queue_depth, purge_finished_jobs, JOB_DONE, JOB_QUEUED
+)
+from layout import format_text_output, sort_text_by_position
+from memory_cache import LRUCache
+from metrics import (
+    HTTP_IN_FLIGHT, HTTP_REQUEST_DURATION, HTTP_REQUESTS, OCR_BYTES, OCR_CACHE_LOOKUPS, OCR_IMAGES,
+    PROMETHEUS_AVAILABLE, observe_stage, render_metrics
+)
+from ocr_pool import OCRWorkerPool
+from ocr_profiles import READTEXT_PROFILES
+from overlay import draw_boxes_on_image
+from preprocessing import (
+    DENOISE_MODES, DOCUMENT_MODES, MAX_WIDTH, ORIENTATION_MODES, compose_transforms, load_image, normalize_orientation,
+    preprocess_image, restore_coordinates
+)
+from tiling import extract_tile, make_tiles, merge_tile_detections
+from uploads import HashingRequest, get_upload_hash
+
 # === CONFIGURATION ===
 UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
 PROCESSED_FOLDER = os.environ.get('PROCESSED_FOLDER', 'processed')
 DATABASE_FILE = os.environ.get('DATABASE_FILE', 'ediscan.db')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'bmp', 'tiff', 'webp'}
 MAX_FILE_AGE_HOURS = int(os.environ.get('MAX_FILE_AGE_HOURS', 24))
 CLEANUP_INTERVAL_SECONDS = int(os.environ.get('CLEANUP_INTERVAL_SECONDS', 3600))
 PORT = int(os.environ.get('PORT', 5000))
 HOST = os.environ.get('HOST', '0.0.0.0')
 DEBUG = os.environ.get('FLASK_ENV', 'development') == 'development'
+MEMORY_CACHE_MAX_ENTRIES = int(os.environ.get('MEMORY_CACHE_MAX_ENTRIES', 256))
+MEMORY_CACHE_MAX_BYTES = int(os.environ.get('MEMORY_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+# Éviction de la table ocr_cache (0 = pas de limite)
+CACHE_TTL_HOURS = int(os.environ.get('CACHE_TTL_HOURS', 168))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 5000))
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 512 * 1024 * 1024))
+# lru: moins récemment consultées d'abord; lfu: moins consultées d'abord, avec vieillissement
+# (une nouvelle entrée part du plus petit compteur du cache, pas de zéro)
+CACHE_EVICTION_POLICIES = ('lru', 'lfu')
+CACHE_EVICTION_POLICY = os.environ.get('CACHE_EVICTION_POLICY', 'lru').lower()
+if CACHE_EVICTION_POLICY not in CACHE_EVICTION_POLICIES:
+    print(f"⚠️ CACHE_EVICTION_POLICY inconnue ({CACHE_EVICTION_POLICY}), utilisation de 'lru'")
+    CACHE_EVICTION_POLICY = 'lru'
+CACHE_EVICTION_BATCH = int(os.environ.get('CACHE_EVICTION_BATCH', 500))
+CACHE_EVICTION_INTERVAL_SECONDS = int(os.environ.get('CACHE_EVICTION_INTERVAL_SECONDS', 300))
+# File de travaux OCR asynchrones
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 1))
+JOB_POLL_INTERVAL_SECONDS = float(os.environ.get('JOB_POLL_INTERVAL_SECONDS', 1.0))
+# Inférence groupée: taille des lots du recognizer et nombre max d'images par passage du détecteur
+OCR_BATCH_SIZE = int(os.environ.get('OCR_BATCH_SIZE', 16))
+OCR_BATCH_MAX_IMAGES = int(os.environ.get('OCR_BATCH_MAX_IMAGES', 8))
+# Images décodées gardées au plus en attente d'un lot (toutes tailles confondues)
+OCR_BATCH_MAX_PENDING_IMAGES = int(os.environ.get('OCR_BATCH_MAX_PENDING_IMAGES', OCR_BATCH_MAX_IMAGES * 2))
+# Pool de processus OCR (0 = Reader unique dans le processus web)
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', 0))
+OCR_TORCH_THREADS = int(os.environ.get('OCR_TORCH_THREADS', 0))  # 0 = cœurs / workers
+# Profil auto: pré-détection rapide puis agrandissement pour atteindre la hauteur de texte cible
+AUTO_PREPASS_CANVAS_SIZE = int(os.environ.get('AUTO_PREPASS_CANVAS_SIZE', 1024))
+AUTO_TARGET_TEXT_HEIGHT = int(os.environ.get('AUTO_TARGET_TEXT_HEIGHT', 32))
+AUTO_MAX_CANVAS_SIZE = int(os.environ.get('AUTO_MAX_CANVAS_SIZE', 3200))
+# OCR par tuiles des très grandes images (auto = plus grand côté > OCR_TILE_MIN_SIDE, off = jamais)
+OCR_TILING = os.environ.get('OCR_TILING', 'auto').lower()
+OCR_TILE_MIN_SIDE = int(os.environ.get('OCR_TILE_MIN_SIDE', 4000))
+OCR_TILE_SIZE = int(os.environ.get('OCR_TILE_SIZE', 1600))
+OCR_TILE_OVERLAP = int(os.environ.get('OCR_TILE_OVERLAP', 200))  # > hauteur d'une ligne de texte
+# Chargement du modèle OCR: background = en arrière-plan (serveur disponible tout de suite,
+# /readyz indique quand il est prêt), eager = avant de servir, lazy = à la première requête OCR
+MODEL_LOADING = os.environ.get('MODEL_LOADING', 'background').lower()
+MODEL_LOADING_LABELS = {
+    'background': 'chargé en arrière-plan',
+    'eager': 'chargé au démarrage',
+    'lazy': 'chargé à la première requête'
+}
+if MODEL_LOADING not in MODEL_LOADING_LABELS:
+    print(f"⚠️ MODEL_LOADING inconnu ({MODEL_LOADING}), utilisation de 'background'")
+    MODEL_LOADING = 'background'
+# Échec du chargement en arrière-plan: nouvel essai après ce délai, doublé à chaque échec
+MODEL_LOAD_RETRY_SECONDS = float(os.environ.get('MODEL_LOAD_RETRY_SECONDS', 5))
+MODEL_LOAD_RETRY_MAX_SECONDS = float(os.environ.get('MODEL_LOAD_RETRY_MAX_SECONDS', 300))
+# Sondes /readyz: vérifications base et file gardées quelques secondes (pas de charge SQLite
+# par sonde); au-delà de READY_MAX_QUEUE_DEPTH travaux en attente, le pod n'est plus prêt (0 = ignoré)
+READY_CHECK_TTL_SECONDS = float(os.environ.get('READY_CHECK_TTL_SECONDS', 5))
+READY_MAX_QUEUE_DEPTH = int(os.environ.get('READY_MAX_QUEUE_DEPTH', 0))
+# Image des détections: plus grand côté de l'aperçu dessiné (0 = pleine résolution)
+PROCESSED_PREVIEW_MAX_SIDE = int(os.environ.get('PROCESSED_PREVIEW_MAX_SIDE', 2000))
+# Images des détections dessinées à la demande: taille max du dossier (0 = pas de limite)
+PROCESSED_CACHE_MAX_BYTES = int(os.environ.get('PROCESSED_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+BOXED_FILENAME_PATTERN = re.compile(r'^boxed_([0-9a-f]{64})_(\d+)\.(\w+)$')
+# Rendu des détections: image dessinée par le serveur, ou coordonnées seules (client)
+OVERLAY_MODES = ('image', 'client')
+# Débruitage du prétraitement (auto = selon le bruit estimé de chaque image)
+DENOISE_MODE = os.environ.get('DENOISE_MODE', 'auto').lower()
+if DENOISE_MODE not in DENOISE_MODES:
+    print(f"⚠️ DENOISE_MODE inconnu ({DENOISE_MODE}), utilisation de 'auto'")
+    DENOISE_MODE = 'auto'
+# Pipeline document (gris + binarisation + redressement): auto = images quasi monochromes
+DOCUMENT_MODE = os.environ.get('DOCUMENT_MODE', 'auto').lower()
+if DOCUMENT_MODE not in DOCUMENT_MODES:
+    print(f"⚠️ DOCUMENT_MODE inconnu ({DOCUMENT_MODE}), utilisation de 'auto'")
+    DOCUMENT_MODE = 'auto'
+# Orientation (90/180/270) et inclinaison corrigées avant chaque OCR, mode rapide compris
+ORIENTATION_MODE = os.environ.get('ORIENTATION_MODE', 'auto').lower()
+if ORIENTATION_MODE not in ORIENTATION_MODES:
+    print(f"⚠️ ORIENTATION_MODE inconnu ({ORIENTATION_MODE}), utilisation de 'auto'")
+    ORIENTATION_MODE = 'auto'
+# Profilage à la demande (/api/ocr, outils): jetons autorisés séparés par des virgules (vide = désactivé)
+PROFILING_TOKENS = [token.strip() for token in os.environ.get('PROFILING_TOKENS', '').split(',') if token.strip()]
+PROFILING_MODE = os.environ.get('PROFILING_MODE', 'cprofile').lower()
+if PROFILING_MODE not in profiling.PROFILING_MODES:
+    print(f"⚠️ PROFILING_MODE inconnu ({PROFILING_MODE}), utilisation de 'cprofile'")
+    PROFILING_MODE = 'cprofile'
+PROFILING_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILING_SAMPLE_INTERVAL_MS', 5))
+PROFILES_FOLDER = os.environ.get('PROFILES_FOLDER', 'profiles')
+PROFILES_MAX_FILES = int(os.environ.get('PROFILES_MAX_FILES', 50))
 
 # Indiquer à Flask que les templates sont dans ../web et les fichiers statiques
 app = Flask(__name__, 
@@ -32,6 +139,8 @@ app = Flask(__name__,
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['PROCESSED_FOLDER'] = PROCESSED_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # Max 16MB
+# Les fichiers uploadés sont hachés pendant leur réception
+app.request_class = HashingRequest
 
 # Importer et enregistrer le Blueprint des outils
 try:
@@ -42,18 +151,244 @@ except ImportError:
     TOOLS_AVAILABLE = False
     print("⚠️ Module features non disponible, outils désactivés")
 
-# Vérifier si GPU disponible (CUDA)
-import torch
-GPU_AVAILABLE = torch.cuda.is_available()
-print(f"🚀 GPU CUDA disponible: {GPU_AVAILABLE}")
-
-# Initialiser le reader avec GPU si disponible
-reader = easyocr.Reader(
-    ['fr', 'en'],
-    gpu=GPU_AVAILABLE,
-    model_storage_directory='models',
-    download_enabled=True
-)
+# Profilage à la demande: téléchargement des profils
+app.register_blueprint(profiling.profiling_bp)
+
+# GPU CUDA détecté au chargement du modèle (torch est importé à ce moment-là)
+GPU_AVAILABLE = False
+
+# Langues du reader (font partie de la clé du cache)
+OCR_LANGUAGES = ['fr', 'en']
+
+# Bornes du profil auto
+AUTO_MIN_MAG_RATIO = 0.5
+AUTO_MAX_MAG_RATIO = 2.5
+AUTO_MIN_CANVAS_SIZE = 640
+
+# Demi-tour confirmé seulement si le reader lit la bande de texte retournée
+# avec une confiance moyenne supérieure d'au moins cet écart
+UPSIDE_DOWN_MIN_CONFIDENCE_GAIN = 0.15
+
+# Dans un worker du pool OCR (spawn), ce module est réimporté sous le nom
+# __mp_main__: il ne doit ni charger de Reader ni relancer l'initialisation
+IS_OCR_POOL_CHILD = __name__ == '__mp_main__'
+
+# Reader local ou pool de workers, créés par load_ocr_backend (en arrière-plan
+# au démarrage, ou à la première requête OCR)
+reader = None
+ocr_pool = None
+_backend_lock = threading.Lock()
+_backend_ready = threading.Event()
+_backend_started = False
+_backend_error = None
+
+# Le Reader partagé n'est pas prévu pour des appels concurrents
+_reader_lock = threading.Lock()
+
+
+def load_ocr_backend():
+    """Charger le modèle OCR une seule fois: Reader local, ou pool de workers démarrés
+    
+    torch et easyocr ne sont importés qu'ici: le serveur répond avant leur chargement.
+    """
+    global reader, ocr_pool, GPU_AVAILABLE, _backend_started, _backend_error
+    with _backend_lock:
+        if _backend_ready.is_set():
+            return
+        
+        _backend_started = True
+        start = time.time()
+        try:
+            import torch
+            GPU_AVAILABLE = torch.cuda.is_available()
+            print(f"🚀 GPU CUDA disponible: {GPU_AVAILABLE}")
+            
+            if OCR_WORKERS > 0:
+                # Un Reader par processus worker, aucun dans le processus web
+                pool = OCRWorkerPool(
+                    OCR_WORKERS,
+                    OCR_LANGUAGES,
+                    gpu=GPU_AVAILABLE,
+                    model_directory='models',
+                    torch_threads=OCR_TORCH_THREADS
+                )
+                pids = pool.warmup()
+                ocr_pool = pool
+                print(f"⚙️ Pool OCR: {len(pids)} workers, {pool.torch_threads} threads torch chacun")
+            else:
+                import easyocr
+                reader = easyocr.Reader(
+                    OCR_LANGUAGES,
+                    gpu=GPU_AVAILABLE,
+                    model_storage_directory='models',
+                    download_enabled=True
+                )
+        except Exception as e:
+            _backend_error = str(e)
+            print(f"❌ Chargement du modèle OCR impossible: {e}")
+            raise
+        
+        _backend_error = None
+        _backend_ready.set()
+        print(f"✅ Modèle OCR prêt ({time.time() - start:.1f}s)")
+
+
+def ensure_ocr_backend():
+    """Attendre le modèle OCR (chargé ici s'il ne l'est pas encore)"""
+    if not _backend_ready.is_set():
+        load_ocr_backend()
+
+
+def start_model_warmup():
+    """Charger le modèle OCR dans un thread: le serveur HTTP démarre sans l'attendre"""
+    def warmup():
+        # /readyz reste en erreur (aucune requête OCR routée vers le pod) jusqu'au
+        # premier chargement réussi: nouveaux essais espacés de plus en plus
+        delay = MODEL_LOAD_RETRY_SECONDS
+        while True:
+            try:
+                load_ocr_backend()
+                return
+            except Exception:
+                pass
+            print(f"🔁 Nouvel essai de chargement du modèle OCR dans {delay:.0f}s")
+            time.sleep(delay)
+            delay = min(delay * 2, MODEL_LOAD_RETRY_MAX_SECONDS)
+    
+    thread = threading.Thread(target=warmup, daemon=True)
+    thread.start()
+
+
+def ocr_backend_status():
+    """État du modèle OCR: ready, loading, error ou not_loaded (MODEL_LOADING=lazy)"""
+    if _backend_ready.is_set():
+        return 'ready'
+    if _backend_error:
+        return 'error'
+    return 'loading' if _backend_started else 'not_loaded'
+
+
+# Dernière vérification de la base et de la file pour /readyz
+_readiness_checks = {'checked_at': 0.0, 'database': None, 'queue': None}
+_readiness_lock = threading.Lock()
+
+
+def check_dependencies():
+    """Base joignable et profondeur de la file, vérifiées au plus toutes les READY_CHECK_TTL_SECONDS"""
+    with _readiness_lock:
+        if time.time() - _readiness_checks['checked_at'] >= READY_CHECK_TTL_SECONDS:
+            try:
+                queue_depth = get_queue_depth()
+                database = 'ok'
+            except sqlite3.Error as e:
+                queue_depth = None
+                database = f"error: {e}"
+            _readiness_checks.update(checked_at=time.time(), database=database, queue=queue_depth)
+        return dict(_readiness_checks)
+
+
+def ocr_readtext(image, **params):
+    """reader.readtext dans le pool de workers, ou sur le Reader local"""
+    ensure_ocr_backend()
+    if ocr_pool is not None:
+        return ocr_pool.readtext(image, **params)
+    with _reader_lock:
+        return reader.readtext(image, **params)
+
+
+def ocr_readtext_batched(images, **params):
+    """reader.readtext_batched dans le pool de workers, ou sur le Reader local"""
+    ensure_ocr_backend()
+    if ocr_pool is not None:
+        return ocr_pool.readtext_batched(images, **params)
+    with _reader_lock:
+        return reader.readtext_batched(images, **params)
+
+
+def ocr_detect(image, **params):
+    """reader.detect (détecteur seul) dans le pool de workers, ou sur le Reader local"""
+    ensure_ocr_backend()
+    if ocr_pool is not None:
+        return ocr_pool.detect(image, **params)
+    with _reader_lock:
+        return reader.detect(image, **params)
+
+
+def needs_tiling(image):
+    """Image trop grande pour un seul passage sans perdre les petits caractères"""
+    return OCR_TILING == 'auto' and max(image.shape[:2]) > OCR_TILE_MIN_SIDE
+
+
+def ocr_readtext_tiled(image, **params):
+    """reader.readtext par tuiles qui se chevauchent, détections fusionnées
+    
+    Tuiles réparties sur les workers du pool en parallèle, sinon OCR groupé
+    sur le Reader local (tuiles de même taille). Retourne (détections, nombre de tuiles).
+    """
+    height, width = image.shape[:2]
+    tiles = make_tiles(height, width, OCR_TILE_SIZE, OCR_TILE_OVERLAP)
+    
+    ensure_ocr_backend()
+    if ocr_pool is not None:
+        futures = [
+            ocr_pool.submit_readtext(extract_tile(image, tile, OCR_TILE_SIZE), **params)
+            for tile in tiles
+        ]
+        tile_results = [future.result() for future in futures]
+    else:
+        tile_results = []
+        for start in range(0, len(tiles), OCR_BATCH_MAX_IMAGES):
+            chunk = [extract_tile(image, tile, OCR_TILE_SIZE) for tile in tiles[start:start + OCR_BATCH_MAX_IMAGES]]
+            tile_results.extend(ocr_readtext_batched(chunk, **params))
+    
+    return merge_tile_detections(tile_results, tiles, height, width), len(tiles)
+
+
+def estimate_text_height(image):
+    """Hauteur médiane du texte (pixels de l'image), d'après une détection à basse résolution
+    
+    None si rien n'est détecté. Le texte trop fin pour la pré-détection n'est pas
+    compté: l'estimation penche vers les grands caractères.
+    """
+    horizontal_list, free_list = ocr_detect(
+        image,
+        min_size=5,
+        canvas_size=AUTO_PREPASS_CANVAS_SIZE,
+        mag_ratio=1.0,
+        text_threshold=READTEXT_PROFILES['auto']['text_threshold'],
+        low_text=READTEXT_PROFILES['auto']['low_text'],
+        link_threshold=READTEXT_PROFILES['auto']['link_threshold']
+    )
+    heights = [y_max - y_min for (x_min, x_max, y_min, y_max) in horizontal_list[0]]
+    # Boîtes inclinées: petit côté du rectangle englobant
+    heights += [min(cv2.minAreaRect(np.array(box, dtype=np.float32))[1]) for box in free_list[0]]
+    heights = [h for h in heights if h > 0]
+    return float(np.median(heights)) if heights else None
+
+
+def choose_auto_params(image):
+    """Paramètres readtext du profil auto, d'après la taille de l'image et du texte
+    
+    Agrandir juste assez pour que le texte atteigne AUTO_TARGET_TEXT_HEIGHT au détecteur:
+    une petite photo n'est plus agrandie inutilement, un grand scan n'est plus écrasé.
+    """
+    text_height = estimate_text_height(image)
+    if text_height is None:
+        # Rien de détecté à basse résolution: paramètres du mode complet
+        return dict(READTEXT_PROFILES['full']), None
+    
+    max_side = max(image.shape[:2])
+    mag_ratio = float(np.clip(AUTO_TARGET_TEXT_HEIGHT / text_height, AUTO_MIN_MAG_RATIO, AUTO_MAX_MAG_RATIO))
+    # Taille visée arrondie au multiple de 32 supérieur (pas du détecteur)
+    canvas_size = int(np.clip(-(-max_side * mag_ratio // 32) * 32, AUTO_MIN_CANVAS_SIZE, AUTO_MAX_CANVAS_SIZE))
+    
+    params = dict(
+        READTEXT_PROFILES['auto'],
+        canvas_size=canvas_size,
+        mag_ratio=round(mag_ratio, 2),
+        min_size=int(np.clip(text_height * 0.5, 5, 20))
+    )
+    return params, round(text_height, 1)
 
 
 # ==========================================
@@ -62,70 +397,118 @@ reader = easyocr.Reader(
 
 def init_database():
     """Initialiser la base de données SQLite"""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    
-    # Table historique
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS history (
-            id TEXT PRIMARY KEY,
-            filename TEXT NOT NULL,
-            original_filename TEXT,
-            extracted_text TEXT,
-            confidence REAL,
-            word_count INTEGER,
-            char_count INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            image_path TEXT,
-            thumbnail_path TEXT,
-            image_hash TEXT
-        )
-    ''')
-    
-    # Migration: Ajouter la colonne image_hash si elle n'existe pas
-    try:
-        cursor.execute('ALTER TABLE history ADD COLUMN image_hash TEXT')
-        print("📦 Migration: colonne image_hash ajoutée")
-    except sqlite3.OperationalError:
-        # La colonne existe déjà
-        pass
-    
-    # Table cache pour éviter de re-OCR les mêmes images
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ocr_cache (
-            image_hash TEXT PRIMARY KEY,
-            extracted_text TEXT,
-            confidence REAL,
-            word_count INTEGER,
-            char_count INTEGER,
-            line_count INTEGER,
-            detection_count INTEGER,
-            detailed_results TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Index pour recherche rapide par hash
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_cache_hash ON ocr_cache(image_hash)')
-    
-    conn.commit()
-    conn.close()
+    with db.transaction() as conn:
+        cursor = conn.cursor()
+        
+        # Table historique
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS history (
+                id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                original_filename TEXT,
+                extracted_text TEXT,
+                confidence REAL,
+                word_count INTEGER,
+                char_count INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                image_path TEXT,
+                thumbnail_path TEXT,
+                image_hash TEXT
+            )
+        ''')
+        
+        # Migration: Ajouter la colonne image_hash si elle n'existe pas
+        try:
+            cursor.execute('ALTER TABLE history ADD COLUMN image_hash TEXT')
+            print("📦 Migration: colonne image_hash ajoutée")
+        except sqlite3.OperationalError:
+            # La colonne existe déjà
+            pass
+        
+        # Index pour retrouver les entrées d'un même contenu
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_hash ON history(image_hash)')
+        
+        # Fichiers stockés par contenu (uploads et images dérivées), avec compteur de références
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stored_files (
+                filename TEXT PRIMARY KEY,
+                image_hash TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                ref_count INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_stored_files_hash ON stored_files(image_hash)')
+        
+        # Migration: l'ancien cache était indexé sur le seul contenu du fichier,
+        # sans les paramètres OCR. Ses entrées sont ambiguës, on le reconstruit.
+        cursor.execute('PRAGMA table_info(ocr_cache)')
+        cache_columns = [col[1] for col in cursor.fetchall()]
+        if cache_columns and 'cache_key' not in cache_columns:
+            cursor.execute('DROP TABLE ocr_cache')
+            print("📦 Migration: cache OCR reconstruit avec clés composites")
+        
+        # Table cache pour éviter de re-OCR les mêmes images
+        # (une entrée par image + profil OCR + prétraitement + langues)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ocr_cache (
+                cache_key TEXT PRIMARY KEY,
+                image_hash TEXT NOT NULL,
+                profile TEXT,
+                preprocessing INTEGER,
+                languages TEXT,
+                detection_count INTEGER,
+                raw_results BLOB,
+                preprocessing_info TEXT,
+                size_bytes INTEGER,
+                hit_count INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_accessed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Migration: colonnes utilisées par l'éviction (taille, accès)
+        try:
+            cursor.execute('ALTER TABLE ocr_cache ADD COLUMN size_bytes INTEGER')
+            cursor.execute('ALTER TABLE ocr_cache ADD COLUMN hit_count INTEGER DEFAULT 0')
+            cursor.execute('ALTER TABLE ocr_cache ADD COLUMN last_accessed_at TIMESTAMP')
+            cursor.execute('''
+                UPDATE ocr_cache
+                SET size_bytes = LENGTH(raw_results), last_accessed_at = created_at
+            ''')
+            print("📦 Migration: colonnes d'éviction du cache ajoutées")
+        except sqlite3.OperationalError:
+            # Les colonnes existent déjà
+            pass
+        
+        # Les anciennes entrées (raw_results en JSON texte) restent lisibles: les
+        # nouvelles sont des BLOB binaires, conservés tels quels par SQLite
+        
+        # Migration: prétraitement appliqué (débruitage choisi), rendu avec les résultats
+        try:
+            cursor.execute('ALTER TABLE ocr_cache ADD COLUMN preprocessing_info TEXT')
+            print("📦 Migration: colonne preprocessing_info ajoutée")
+        except sqlite3.OperationalError:
+            # La colonne existe déjà
+            pass
+        
+        # Index pour retrouver toutes les variantes d'une même image
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_cache_hash ON ocr_cache(image_hash)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_cache_access ON ocr_cache(last_accessed_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_cache_hits ON ocr_cache(hit_count, last_accessed_at)')
     print("📦 Base de données initialisée")
     print("💾 Cache OCR activé")
 
 
 def save_to_history(entry_id, filename, original_filename, text, confidence, word_count, char_count, image_path, image_hash=None):
     """Sauvegarder une extraction dans l'historique"""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT INTO history (id, filename, original_filename, extracted_text, confidence, word_count, char_count, image_path, image_hash)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (entry_id, filename, original_filename, text, confidence, word_count, char_count, image_path, image_hash))
-    
-    conn.commit()
-    conn.close()
+    with db.transaction() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            INSERT INTO history (id, filename, original_filename, extracted_text, confidence, word_count, char_count, image_path, image_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (entry_id, filename, original_filename, text, confidence, word_count, char_count, image_path, image_hash))
 
 
 # ==========================================
@@ -142,125 +525,359 @@ def calculate_image_hash(filepath):
     return hasher.hexdigest()
 
 
-def get_from_cache(image_hash):
-    """Récupérer un résultat OCR depuis le cache"""
-    conn = sqlite3.connect(DATABASE_FILE)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+def serialize_ocr_results(detections):
+    """Sérialiser les détections brutes en binaire compact (BLOB SQLite)"""
+    return Detections.from_results(detections).to_bytes()
+
+
+def deserialize_ocr_results(data):
+    """Reconstruire les détections brutes (binaire, ou JSON des anciennes entrées)"""
+    if isinstance(data, (bytes, memoryview)):
+        return Detections.from_bytes(data)
+    return Detections.from_results(json.loads(data))
+
+
+# Niveau mémoire devant SQLite: détections déjà décodées
+memory_cache = LRUCache(MEMORY_CACHE_MAX_ENTRIES, MEMORY_CACHE_MAX_BYTES)
+
+# Accès au cache en attente d'écriture: {cache_key: (dernier accès, nombre de hits)}
+# Regroupés et écrits par le scheduler pour éviter une écriture par lecture
+_pending_cache_touches = {}
+_pending_cache_touches_lock = threading.Lock()
+
+
+def record_cache_access(cache_key):
+    """Mémoriser un hit du cache (écrit plus tard par flush_cache_accesses)"""
+    now = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    with _pending_cache_touches_lock:
+        _, hits = _pending_cache_touches.get(cache_key, (None, 0))
+        _pending_cache_touches[cache_key] = (now, hits + 1)
+
+
+def build_cache_key(image_hash, profile_name, use_preprocessing):
+    """Construire la clé composite du cache (image + paramètres OCR)"""
+    key_parts = {
+        'image': image_hash,
+        'profile': profile_name,
+        'params': READTEXT_PROFILES[profile_name],
+        'preprocessing': bool(use_preprocessing),
+        'denoise': DENOISE_MODE if use_preprocessing else None,
+        'document_mode': DOCUMENT_MODE if use_preprocessing else None,
+        'orientation': ORIENTATION_MODE,
+        'tiling': [OCR_TILE_MIN_SIDE, OCR_TILE_SIZE, OCR_TILE_OVERLAP] if OCR_TILING == 'auto' else None,
+        'languages': sorted(OCR_LANGUAGES)
+    }
+    if profile_name == 'auto':
+        # Paramètres readtext choisis par image à partir de ces réglages
+        key_parts['auto'] = [AUTO_PREPASS_CANVAS_SIZE, AUTO_TARGET_TEXT_HEIGHT, AUTO_MAX_CANVAS_SIZE]
+    return hashlib.sha256(json.dumps(key_parts, sort_keys=True).encode()).hexdigest()
+
+
+def get_from_cache(cache_key):
+    """Récupérer les détections brutes depuis le cache (mémoire puis SQLite)
     
-    cursor.execute('SELECT * FROM ocr_cache WHERE image_hash = ?', (image_hash,))
-    row = cursor.fetchone()
-    conn.close()
+    Retourne (détections brutes, infos du prétraitement) ou None.
+    """
+    cached = memory_cache.get(cache_key)
+    if cached is not None:
+        record_cache_access(cache_key)
+        return cached
     
-    if row:
-        return {
-            'text': row['extracted_text'],
-            'confidence': row['confidence'],
-            'word_count': row['word_count'],
-            'char_count': row['char_count'],
-            'line_count': row['line_count'],
-            'detection_count': row['detection_count'],
-            'detailed_results': json.loads(row['detailed_results']) if row['detailed_results'] else []
-        }
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT raw_results, preprocessing_info FROM ocr_cache WHERE cache_key = ?', (cache_key,))
+        row = cursor.fetchone()
+    
+    if row and row['raw_results'] is not None:
+        raw_results = deserialize_ocr_results(row['raw_results'])
+        preprocessing_info = json.loads(row['preprocessing_info']) if row['preprocessing_info'] else None
+        memory_cache.put(cache_key, (raw_results, preprocessing_info), raw_results.nbytes)
+        record_cache_access(cache_key)
+        return raw_results, preprocessing_info
     return None
 
 
-def save_to_cache(image_hash, text, stats, detailed_results):
-    """Sauvegarder un résultat OCR dans le cache"""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
+def save_to_cache(cache_key, image_hash, profile_name, use_preprocessing, raw_results, preprocessing_info=None):
+    """Sauvegarder les détections brutes (et le prétraitement appliqué) dans le cache"""
+    raw_results = Detections.from_results(raw_results)
+    serialized = serialize_ocr_results(raw_results)
     
-    cursor.execute('''
-        INSERT OR REPLACE INTO ocr_cache 
-        (image_hash, extracted_text, confidence, word_count, char_count, line_count, detection_count, detailed_results)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        image_hash,
-        text,
-        stats['avg_confidence'],
-        stats['word_count'],
-        stats['char_count'],
-        stats['line_count'],
-        stats['detection_count'],
-        json.dumps(detailed_results)
-    ))
+    with db.transaction() as conn:
+        cursor = conn.cursor()
+        
+        # LFU avec vieillissement: une nouvelle entrée part du plus petit compteur
+        # (à égalité, les plus anciennes partent avant elle) et ce plancher monte
+        # au fil des évictions, ce qui fait vieillir les entrées populaires délaissées
+        if CACHE_EVICTION_POLICY == 'lfu':
+            hit_count = cursor.execute('SELECT COALESCE(MIN(hit_count), 0) FROM ocr_cache').fetchone()[0]
+        else:
+            hit_count = 0
+        
+        cursor.execute('''
+            INSERT OR REPLACE INTO ocr_cache 
+            (cache_key, image_hash, profile, preprocessing, languages, detection_count, raw_results,
+             preprocessing_info, size_bytes, hit_count, last_accessed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (
+            cache_key,
+            image_hash,
+            profile_name,
+            int(bool(use_preprocessing)),
+            ','.join(OCR_LANGUAGES),
+            len(raw_results),
+            serialized,
+            json.dumps(preprocessing_info) if preprocessing_info else None,
+            len(serialized),
+            hit_count
+        ))
+    
+    memory_cache.put(cache_key, (raw_results, preprocessing_info), raw_results.nbytes)
+
+
+def flush_cache_accesses():
+    """Écrire en une transaction les accès au cache mémorisés"""
+    with _pending_cache_touches_lock:
+        touches = list(_pending_cache_touches.items())
+        _pending_cache_touches.clear()
+    
+    if not touches:
+        return 0
+    
+    with db.transaction() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            'UPDATE ocr_cache SET last_accessed_at = ?, hit_count = hit_count + ? WHERE cache_key = ?',
+            [(accessed_at, hits, cache_key) for cache_key, (accessed_at, hits) in touches]
+        )
+    return len(touches)
+
+
+def evict_cache_entries():
+    """Supprimer un lot d'entrées expirées ou au-delà des limites du cache"""
+    flush_cache_accesses()
+    
+    if CACHE_EVICTION_POLICY == 'lfu':
+        order_by = 'hit_count ASC, last_accessed_at ASC'
+    else:
+        order_by = 'last_accessed_at ASC'
     
-    conn.commit()
-    conn.close()
+    with db.transaction() as conn:
+        cursor = conn.cursor()
+        victims = []
+        
+        # 1. Entrées non consultées depuis plus de CACHE_TTL_HOURS
+        if CACHE_TTL_HOURS > 0:
+            cursor.execute('''
+                SELECT cache_key FROM ocr_cache
+                WHERE last_accessed_at < datetime('now', ?)
+                ORDER BY last_accessed_at ASC
+                LIMIT ?
+            ''', (f'-{CACHE_TTL_HOURS} hours', CACHE_EVICTION_BATCH))
+            victims = [row[0] for row in cursor.fetchall()]
+            cursor.executemany('DELETE FROM ocr_cache WHERE cache_key = ?', [(key,) for key in victims])
+        
+        # 2. Dépassement du nombre d'entrées ou de la taille totale
+        remaining_budget = CACHE_EVICTION_BATCH - len(victims)
+        cursor.execute('SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM ocr_cache')
+        count, total_bytes = cursor.fetchone()
+        
+        def over_limits():
+            return ((CACHE_MAX_ENTRIES > 0 and count > CACHE_MAX_ENTRIES)
+                    or (CACHE_MAX_BYTES > 0 and total_bytes > CACHE_MAX_BYTES))
+        
+        if remaining_budget > 0 and over_limits():
+            cursor.execute(f'''
+                SELECT cache_key, COALESCE(size_bytes, 0) FROM ocr_cache
+                ORDER BY {order_by}
+                LIMIT ?
+            ''', (remaining_budget,))
+            over_limit_victims = []
+            for cache_key, size in cursor.fetchall():
+                if not over_limits():
+                    break
+                over_limit_victims.append(cache_key)
+                count -= 1
+                total_bytes -= size
+            cursor.executemany('DELETE FROM ocr_cache WHERE cache_key = ?', [(key,) for key in over_limit_victims])
+            victims.extend(over_limit_victims)
+    
+    if victims:
+        for cache_key in victims:
+            memory_cache.discard(cache_key)
+        print(f"🧹 Cache OCR: {len(victims)} entrées évincées ({CACHE_EVICTION_POLICY})")
+    
+    return len(victims)
 
 
 def get_cache_stats():
     """Obtenir les statistiques du cache"""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT COUNT(*) FROM ocr_cache')
-    count = cursor.fetchone()[0]
-    
-    conn.close()
-    return {'cached_images': count}
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM ocr_cache')
+        count, total_bytes = cursor.fetchone()
+    return {
+        'cached_images': count,
+        'cached_bytes': total_bytes,
+        'eviction_policy': CACHE_EVICTION_POLICY,
+        'memory': memory_cache.stats()
+    }
 
 
 def clear_cache():
     """Vider le cache OCR"""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM ocr_cache')
-    conn.commit()
-    conn.close()
+    with db.transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM ocr_cache')
+    memory_cache.clear()
 
 
 def get_history(limit=20):
     """Récupérer l'historique des extractions"""
-    conn = sqlite3.connect(DATABASE_FILE)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT * FROM history 
-        ORDER BY created_at DESC 
-        LIMIT ?
-    ''', (limit,))
-    
-    rows = cursor.fetchall()
-    conn.close()
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT * FROM history 
+            ORDER BY created_at DESC 
+            LIMIT ?
+        ''', (limit,))
+        
+        rows = cursor.fetchall()
     
     return [dict(row) for row in rows]
 
 
 def get_history_entry(entry_id):
     """Récupérer une entrée spécifique de l'historique"""
-    conn = sqlite3.connect(DATABASE_FILE)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT * FROM history WHERE id = ?', (entry_id,))
-    row = cursor.fetchone()
-    conn.close()
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT * FROM history WHERE id = ?', (entry_id,))
+        row = cursor.fetchone()
     
     return dict(row) if row else None
 
 
 def delete_history_entry(entry_id):
     """Supprimer une entrée de l'historique"""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute('DELETE FROM history WHERE id = ?', (entry_id,))
+    with db.transaction() as conn:
+        cursor = conn.cursor()
+        
+        row = cursor.execute('SELECT image_hash FROM history WHERE id = ?', (entry_id,)).fetchone()
+        cursor.execute('DELETE FROM history WHERE id = ?', (entry_id,))
     
-    conn.commit()
-    conn.close()
+    # L'entrée libère sa référence sur le fichier stocké
+    if row and row['image_hash']:
+        release_stored_upload(row['image_hash'])
 
 
 def clear_history():
     """Vider tout l'historique"""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute('DELETE FROM history')
+    with db.transaction() as conn:
+        cursor = conn.cursor()
+        
+        references = cursor.execute('''
+            SELECT image_hash, COUNT(*) AS count FROM history
+            WHERE image_hash IS NOT NULL
+            GROUP BY image_hash
+        ''').fetchall()
+        cursor.execute('DELETE FROM history')
     
-    conn.commit()
-    conn.close()
+    for row in references:
+        release_stored_upload(row['image_hash'], row['count'])
+
+
+# ==========================================
+# STOCKAGE PAR CONTENU - Un fichier par image
+# ==========================================
+
+def content_addressed_filename(image_hash, original_filename):
+    """Nom de fichier dérivé du contenu de l'image"""
+    ext = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else 'png'
+    return f"{image_hash}.{ext}"
+
+
+def get_stored_upload(image_hash):
+    """Nom du fichier stocké pour ce contenu (None si absent)"""
+    with db.connection() as conn:
+        row = conn.execute('''
+            SELECT filename FROM stored_files
+            WHERE image_hash = ? AND kind = 'upload'
+        ''', (image_hash,)).fetchone()
+    return row['filename'] if row else None
+
+
+def acquire_stored_upload(image_hash, filename):
+    """Enregistrer un upload stocké et prendre une référence dessus"""
+    with db.transaction() as conn:
+        conn.execute('''
+            INSERT INTO stored_files (filename, image_hash, kind, ref_count)
+            VALUES (?, ?, 'upload', 1)
+            ON CONFLICT(filename) DO UPDATE SET ref_count = ref_count + 1
+        ''', (filename, image_hash))
+
+
+def register_processed_file(image_hash, filename):
+    """Rattacher une image dérivée (boîtes, prétraitement) à son upload"""
+    with db.transaction() as conn:
+        conn.execute('''
+            INSERT OR IGNORE INTO stored_files (filename, image_hash, kind)
+            VALUES (?, ?, 'processed')
+        ''', (filename, image_hash))
+
+
+def release_stored_upload(image_hash, count=1):
+    """Libérer des références; à zéro, supprimer l'upload et ses images dérivées"""
+    with db.transaction() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            UPDATE stored_files SET ref_count = MAX(ref_count - ?, 0)
+            WHERE image_hash = ? AND kind = 'upload'
+        ''', (count, image_hash))
+        row = cursor.execute('''
+            SELECT ref_count FROM stored_files
+            WHERE image_hash = ? AND kind = 'upload'
+        ''', (image_hash,)).fetchone()
+        if row is None or row['ref_count'] > 0:
+            return
+        
+        files = cursor.execute('''
+            SELECT filename, kind FROM stored_files WHERE image_hash = ?
+        ''', (image_hash,)).fetchall()
+        cursor.execute('DELETE FROM stored_files WHERE image_hash = ?', (image_hash,))
+    
+    for stored in files:
+        folder = UPLOAD_FOLDER if stored['kind'] == 'upload' else PROCESSED_FOLDER
+        filepath = os.path.join(folder, stored['filename'])
+        try:
+            os.remove(filepath)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"⚠️ Erreur suppression {filepath}: {e}")
+
+
+def forget_stored_files(filenames):
+    """Oublier des images dérivées supprimées du disque (nettoyage automatique)
+
+    Un upload garde sa ligne et ses références: seul release_stored_upload
+    la supprime, et le fichier est réécrit au prochain upload du même contenu.
+    """
+    with db.transaction() as conn:
+        conn.executemany(
+            "DELETE FROM stored_files WHERE filename = ? AND kind = 'processed'",
+            [(name,) for name in filenames]
+        )
+
+
+def get_cached_image_hash(cache_key):
+    """Hash de l'image d'une entrée du cache OCR (None si expirée)"""
+    with db.connection() as conn:
+        row = conn.execute('SELECT image_hash FROM ocr_cache WHERE cache_key = ?', (cache_key,)).fetchone()
+    return row['image_hash'] if row else None
 
 
 # ==========================================
@@ -272,6 +889,7 @@ def cleanup_old_files():
     folders = [UPLOAD_FOLDER, PROCESSED_FOLDER]
     cutoff_time = datetime.now() - timedelta(hours=MAX_FILE_AGE_HOURS)
     deleted_count = 0
+    deleted_filenames = []
     
     for folder in folders:
         if not os.path.exists(folder):
@@ -287,21 +905,70 @@ def cleanup_old_files():
                     try:
                         os.remove(filepath)
                         deleted_count += 1
+                        deleted_filenames.append(filename)
                     except Exception as e:
                         print(f"⚠️ Erreur suppression {filepath}: {e}")
     
+    forget_stored_files(deleted_filenames)
+    
     if deleted_count > 0:
         print(f"🧹 Nettoyage: {deleted_count} fichiers supprimés")
     
     return deleted_count
 
 
+def evict_processed_files(keep=None):
+    """Borner le dossier des images dessinées: les moins récemment servies d'abord
+    
+    Ces images sont redessinées à la demande tant que les détections sont en cache.
+    keep: image en cours de service, jamais évincée.
+    """
+    if PROCESSED_CACHE_MAX_BYTES <= 0 or not os.path.exists(PROCESSED_FOLDER):
+        return 0
+    
+    entries = []
+    with os.scandir(PROCESSED_FOLDER) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.startswith('boxed_') and entry.name != keep:
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.name))
+    
+    total_bytes = sum(size for _, size, _ in entries)
+    if keep and os.path.exists(os.path.join(PROCESSED_FOLDER, keep)):
+        total_bytes += os.path.getsize(os.path.join(PROCESSED_FOLDER, keep))
+    evicted = []
+    for _, size, filename in sorted(entries):
+        if total_bytes <= PROCESSED_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(os.path.join(PROCESSED_FOLDER, filename))
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+        evicted.append(filename)
+    
+    forget_stored_files(evicted)
+    return len(evicted)
+
+
 def start_cleanup_scheduler():
     """Démarrer le scheduler de nettoyage en arrière-plan"""
     def cleanup_loop():
+        # L'éviction du cache tourne par petits lots, plus souvent que le nettoyage des fichiers
+        tick = min(CLEANUP_INTERVAL_SECONDS, CACHE_EVICTION_INTERVAL_SECONDS)
+        # Premier nettoyage au démarrage, sans retarder le serveur HTTP
+        cleanup_old_files()
+        last_file_cleanup = time.time()
         while True:
-            time.sleep(CLEANUP_INTERVAL_SECONDS)
-            cleanup_old_files()
+            time.sleep(tick)
+            try:
+                evict_cache_entries()
+            except sqlite3.Error as e:
+                print(f"⚠️ Erreur éviction cache: {e}")
+            if time.time() - last_file_cleanup >= CLEANUP_INTERVAL_SECONDS:
+                cleanup_old_files()
+                purge_finished_jobs(MAX_FILE_AGE_HOURS)
+                last_file_cleanup = time.time()
     
     thread = threading.Thread(target=cleanup_loop, daemon=True)
     thread.start()
@@ -316,246 +983,439 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def generate_unique_filename(original_filename):
-    """Générer un nom de fichier unique"""
-    ext = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else 'png'
-    unique_id = str(uuid.uuid4())[:8]
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    return f"{timestamp}_{unique_id}.{ext}"
-
-
-def preprocess_image(image_path, output_path=None):
-    """Prétraitement de l'image pour améliorer la qualité OCR"""
-    img = Image.open(image_path)
-    
-    if img.mode != 'RGB':
-        img = img.convert('RGB')
-    
-    max_width = 2000
-    if img.width > max_width:
-        ratio = max_width / img.width
-        new_size = (max_width, int(img.height * ratio))
-        img = img.resize(new_size, Image.Resampling.LANCZOS)
-    
-    enhancer = ImageEnhance.Contrast(img)
-    img = enhancer.enhance(1.3)
-    
-    enhancer = ImageEnhance.Sharpness(img)
-    img = enhancer.enhance(1.5)
-    
-    img_cv = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-    img_cv = cv2.fastNlMeansDenoisingColored(img_cv, None, 6, 6, 7, 21)
+def calculate_stats(detections, full_text, min_confidence):
+    """Calculer les statistiques du texte extrait (détections retenues au seuil min_confidence)"""
+    confidences = detections.confidences[detections.confidences >= min_confidence]
+    if not confidences.size:
+        return {
+            'char_count': 0,
+            'word_count': 0,
+            'line_count': 0,
+            'avg_confidence': 0,
+            'detection_count': 0
+        }
     
-    if output_path:
-        cv2.imwrite(output_path, img_cv)
-        return output_path
+    words = full_text.split()
+    lines = [l for l in full_text.split('\n') if l.strip()]
     
-    return img_cv
+    return {
+        'char_count': len(full_text),
+        'word_count': len(words),
+        'line_count': len(lines),
+        'avg_confidence': round(float(confidences.mean()) * 100, 1),
+        'detection_count': int(confidences.size)
+    }
 
 
-def sort_text_by_position(ocr_results, line_threshold=15):
-    """Trier les résultats OCR par position spatiale"""
-    if not ocr_results:
-        return []
-    
-    text_items = []
-    for (bbox, text, confidence) in ocr_results:
-        x_coords = [point[0] for point in bbox]
-        y_coords = [point[1] for point in bbox]
-        center_x = sum(x_coords) / 4
-        top_y = min(y_coords)
-        
-        text_items.append({
-            'text': text,
-            'confidence': confidence,
-            'center_x': center_x,
-            'top_y': top_y,
-            'bbox': bbox
-        })
-    
-    text_items.sort(key=lambda x: x['top_y'])
-    
-    lines = []
-    current_line = [text_items[0]]
+def requested_ocr_profile():
+    """Profil OCR demandé: case quick_mode, sinon champ 'profile' (full par défaut)"""
+    if request.form.get('quick_mode') == 'on':
+        return 'quick'
+    profile_name = request.form.get('profile', 'full')
+    return profile_name if profile_name in READTEXT_PROFILES else 'full'
+
+
+def boxed_filename(cache_key, ext):
+    """Nom de l'image des boîtes d'une entrée du cache (clé complète: redessinable)"""
+    return f"boxed_{cache_key}_{PROCESSED_PREVIEW_MAX_SIDE}.{ext}"
+
+
+def render_boxed_file(filename):
+    """Dessiner l'image des boîtes demandée depuis le cache OCR
     
-    for item in text_items[1:]:
-        if abs(item['top_y'] - current_line[0]['top_y']) < line_threshold:
-            current_line.append(item)
-        else:
-            lines.append(current_line)
-            current_line = [item]
-    lines.append(current_line)
+    Retourne False si le nom ne correspond pas à la configuration, si les
+    détections ont expiré du cache ou si l'upload n'existe plus.
+    """
+    match = BOXED_FILENAME_PATTERN.match(filename)
+    cache_key, max_side, ext = match.group(1), int(match.group(2)), match.group(3).lower()
+    if max_side != PROCESSED_PREVIEW_MAX_SIDE or ext not in ALLOWED_EXTENSIONS:
+        return False
     
-    sorted_lines = []
-    for line in lines:
-        sorted_line = sorted(line, key=lambda x: x['center_x'])
-        sorted_lines.append(sorted_line)
+    image_hash = get_cached_image_hash(cache_key)
+    cached_result = get_from_cache(cache_key) if image_hash else None
+    upload_filename = get_stored_upload(image_hash) if cached_result else None
+    if upload_filename is None:
+        return False
+    upload_path = os.path.join(UPLOAD_FOLDER, upload_filename)
+    if not os.path.exists(upload_path):
+        return False
     
-    return sorted_lines
+    os.makedirs(PROCESSED_FOLDER, exist_ok=True)
+    boxed_path = os.path.join(PROCESSED_FOLDER, filename)
+    # Écriture atomique: deux premiers accès simultanés écrivent la même image
+    tmp_path = f"{boxed_path}.{uuid.uuid4().hex[:8]}.tmp.{ext}"
+    with observe_stage('draw_boxes'):
+        draw_boxes_on_image(load_image(upload_path), cached_result[0], tmp_path, PROCESSED_PREVIEW_MAX_SIDE)
+    os.replace(tmp_path, boxed_path)
+    register_processed_file(image_hash, filename)
+    evict_processed_files(keep=filename)
+    return True
 
 
-def format_text_output(sorted_lines, min_confidence=0.3):
-    """Formater le texte extrait"""
-    output_lines = []
-    detailed_results = []
-    
-    for line in sorted_lines:
-        line_texts = []
-        for item in line:
-            if item['confidence'] >= min_confidence:
-                line_texts.append(item['text'])
-                detailed_results.append({
-                    'text': item['text'],
-                    'confidence': round(item['confidence'] * 100, 1),
-                    'bbox': [[int(p[0]), int(p[1])] for p in item['bbox']]
-                })
-        
-        if line_texts:
-            output_lines.append(' '.join(line_texts))
+def requested_overlay_mode():
+    """Rendu des détections demandé: champ 'overlay' (image par défaut, client = coordonnées seules)"""
+    overlay = request.values.get('overlay', 'image')
+    return overlay if overlay in OVERLAY_MODES else 'image'
+
+
+def resolve_ocr_profile(use_preprocessing, profile_name):
+    """Prétraitement effectif (pas en mode rapide)"""
+    return use_preprocessing and profile_name != 'quick'
+
+
+def run_tiled_ocr(ocr_input, params, info):
+    """OCR par tuiles d'une grande image; le nombre de tuiles est ajouté aux infos"""
+    print(f"🧩 OCR par tuiles: {ocr_input.shape[1]}x{ocr_input.shape[0]}...")
+    result, tile_count = ocr_readtext_tiled(ocr_input, batch_size=OCR_BATCH_SIZE, **params)
+    return result, dict(info or {}, tiles=tile_count)
+
+
+def resolve_readtext_params(ocr_input, profile_name, info):
+    """Paramètres readtext pour cette image; ceux du profil auto sont ajoutés aux infos"""
+    if profile_name != 'auto':
+        return READTEXT_PROFILES[profile_name], info
     
-    return '\n'.join(output_lines), detailed_results
+    params, text_height = choose_auto_params(ocr_input)
+    info = dict(info or {})
+    info['ocr_params'] = dict(params, text_height=text_height)
+    return params, info
 
 
-def draw_boxes_on_image(image_path, ocr_results, output_path):
-    """Dessiner les boîtes de détection sur l'image"""
-    img = cv2.imread(image_path)
+def save_upload(file):
+    """Enregistrer un fichier uploadé dans le stockage par contenu
     
-    for (bbox, text, confidence) in ocr_results:
-        pts = np.array(bbox, dtype=np.int32)
-        color = (int(255 * (1 - confidence)), int(255 * confidence), 0)
-        cv2.polylines(img, [pts], True, color, 2)
-        conf_text = f"{int(confidence * 100)}%"
-        cv2.putText(img, conf_text, (pts[0][0], pts[0][1] - 5), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+    Le hash est calculé pendant la réception: un contenu déjà stocké n'est
+    pas réécrit, l'upload prend seulement une référence sur le fichier existant.
+    """
+    original_filename = file.filename
+    image_hash = get_upload_hash(file)
+    
+    filename = get_stored_upload(image_hash)
+    filepath = os.path.join(UPLOAD_FOLDER, filename) if filename else None
+    
+    if filepath and os.path.exists(filepath):
+        # Repousser le nettoyage automatique de ce fichier
+        os.utime(filepath)
+    else:
+        # Fichier supprimé par le nettoyage automatique: réécrit sous le même nom,
+        # la ligne garde le compte des références de l'historique
+        if filename is None:
+            filename = content_addressed_filename(image_hash, original_filename)
+            filepath = os.path.join(UPLOAD_FOLDER, filename)
+        # Écriture atomique: deux uploads identiques simultanés écrivent le même contenu
+        tmp_path = f"{filepath}.{uuid.uuid4().hex[:8]}.tmp"
+        file.save(tmp_path)
+        os.replace(tmp_path, filepath)
     
-    cv2.imwrite(output_path, img)
-    return output_path
+    acquire_stored_upload(image_hash, filename)
+    OCR_BYTES.inc(os.path.getsize(filepath))
+    return {
+        'filepath': filepath,
+        'filename': filename,
+        'original_filename': original_filename,
+        'image_hash': image_hash
+    }
 
 
-def calculate_stats(detailed_results, full_text):
-    """Calculer les statistiques du texte extrait"""
-    if not detailed_results:
-        return {
-            'char_count': 0,
-            'word_count': 0,
-            'line_count': 0,
-            'avg_confidence': 0,
-            'detection_count': 0
-        }
+def mean_text_confidence(results):
+    """Confiance moyenne des détections, pondérée par la longueur du texte"""
+    weights = [len(text) for (_, text, _) in results]
+    if not sum(weights):
+        return 0.0
+    return sum(float(confidence) * weight for (_, _, confidence), weight in zip(results, weights)) / sum(weights)
+
+
+def reads_better_upside_down(band):
+    """Second indice du demi-tour: lecture rapide de la bande de texte à 0° et à 180°"""
+    params = READTEXT_PROFILES['quick']
+    upright = mean_text_confidence(ocr_readtext(band, **params))
+    flipped = mean_text_confidence(ocr_readtext(cv2.rotate(band, cv2.ROTATE_180), **params))
+    return flipped >= upright + UPSIDE_DOWN_MIN_CONFIDENCE_GAIN
+
+
+def prepare_ocr_input(image, use_preprocessing):
+    """Retourner le tableau à passer au reader (sans passer par le disque), les infos
+    du prétraitement appliqué et la transformation upload -> image passée au reader
+    (None si l'image est passée telle quelle)
+    """
+    info = {}
+    transform = None
+    # Grande image OCR par tuiles: pleine résolution conservée au prétraitement
+    tiled = needs_tiling(image)
+    
+    # Texte remis à l'endroit et à l'horizontale: un premier passage correct
+    # évite de relancer en mode complet des images tournées
+    if ORIENTATION_MODE != 'off':
+        image, info, transform = normalize_orientation(image, ORIENTATION_MODE, reads_better_upside_down)
+        if not info['rotation'] and not info['skew_angle']:
+            transform = None
+    
+    if use_preprocessing:
+        image, preprocessing_info = preprocess_image(
+            image, DENOISE_MODE, DOCUMENT_MODE, deskew=ORIENTATION_MODE == 'off',
+            max_width=None if tiled else MAX_WIDTH
+        )
+        transform = compose_transforms(preprocessing_info.pop('transform'), transform)
+        info.update(preprocessing_info)
+    
+    return image, info or None, transform
+
+
+def build_image_result(filepath, filename, original_filename, image_hash, cache_key, result, min_confidence,
+                       from_cache, preprocessing_info=None, profile_name=None, overlay='image'):
+    """Formater et historiser les détections brutes d'une image
+    
+    overlay: 'image' = URL de l'image des boîtes (dessinée au premier accès),
+    'client' = pas d'image, le client trace detailed_results.
+    """
+    # Filtrer et formater après la lecture du cache: une même entrée
+    # sert n'importe quel seuil min_confidence
+    # Ordre de lecture dans le repère du texte remis à l'endroit (les boîtes
+    # restent dans celui de l'upload pour l'affichage)
+    rotation = (preprocessing_info or {}).get('rotation', 0)
+    with observe_stage('sort_format'):
+        detections = Detections.from_results(result)
+        sorted_lines = sort_text_by_position(detections, rotation)
+        ocr_text, detailed_results = format_text_output(detections, sorted_lines, min_confidence)
+        stats = calculate_stats(detections, ocr_text, min_confidence)
+    OCR_IMAGES.labels(profile_name).inc()
+    
+    # Image des boîtes: seulement l'URL, dessinée par processed_file au premier accès
+    # (les clients API qui ne la demandent pas ne paient ni encodage ni écriture)
+    processed_image = None
+    if overlay == 'image':
+        ext = filename.rsplit('.', 1)[1] if '.' in filename else 'png'
+        processed_image = url_for('processed_file', filename=boxed_filename(cache_key, ext))
+    
+    # Paramètres readtext utilisés (choisis par image en profil auto)
+    if preprocessing_info and 'ocr_params' in preprocessing_info:
+        preprocessing_info = dict(preprocessing_info)
+        ocr_params = preprocessing_info.pop('ocr_params')
+    else:
+        ocr_params = READTEXT_PROFILES.get(profile_name)
     
-    confidences = [r['confidence'] for r in detailed_results]
-    words = full_text.split()
-    lines = [l for l in full_text.split('\n') if l.strip()]
+    # Sauvegarder dans l'historique
+    entry_id = str(uuid.uuid4())[:12]
+    with observe_stage('db_write'):
+        save_to_history(
+            entry_id=entry_id,
+            filename=filename,
+            original_filename=original_filename,
+            text=ocr_text,
+            confidence=stats['avg_confidence'],
+            word_count=stats['word_count'],
+            char_count=stats['char_count'],
+            image_path=filepath,
+            image_hash=image_hash
+        )
     
     return {
-        'char_count': len(full_text),
-        'word_count': len(words),
-        'line_count': len(lines),
-        'avg_confidence': round(sum(confidences) / len(confidences), 1),
-        'detection_count': len(detailed_results)
+        'id': entry_id,
+        'filename': filename,
+        'original_filename': original_filename,
+        'text': ocr_text,
+        'stats': stats,
+        'detailed_results': detailed_results,
+        'uploaded_image': url_for('uploaded_file', filename=filename),
+        'processed_image': processed_image,
+        'overlay': overlay,
+        'preprocessing': preprocessing_info or None,
+        'ocr_profile': profile_name,
+        'ocr_params': ocr_params,
+        'from_cache': from_cache
     }
 
 
-def process_single_image(filepath, filename, original_filename, min_confidence, use_preprocessing, quick_mode):
-    """Traiter une seule image et retourner les résultats"""
+def process_single_image(filepath, filename, original_filename, min_confidence, use_preprocessing, profile_name,
+                         image_hash=None, overlay='image'):
+    """Traiter une seule image et retourner les résultats (profile_name: quick, full ou auto)"""
     
-    # Calculer le hash de l'image pour le cache
-    image_hash = calculate_image_hash(filepath)
+    # Le prétraitement n'est pas appliqué en mode rapide
+    use_preprocessing = resolve_ocr_profile(use_preprocessing, profile_name)
+    
+    # Clé du cache: contenu de l'image + paramètres qui influencent l'OCR
+    # (hash déjà calculé pendant l'upload, sinon relu depuis le disque)
+    if image_hash is None:
+        with observe_stage('hash'):
+            image_hash = calculate_image_hash(filepath)
+    cache_key = build_cache_key(image_hash, profile_name, use_preprocessing)
     from_cache = False
+    preprocessing_info = None
     
     # Vérifier si l'image est déjà dans le cache
-    cached_result = get_from_cache(image_hash)
-    
-    if cached_result:
-        # Utiliser le résultat en cache
-        ocr_text = cached_result['text']
-        detailed_results = cached_result['detailed_results']
-        stats = {
-            'avg_confidence': cached_result['confidence'],
-            'word_count': cached_result['word_count'],
-            'char_count': cached_result['char_count'],
-            'line_count': cached_result['line_count'],
-            'detection_count': cached_result['detection_count']
-        }
+    with observe_stage('cache_lookup'):
+        cached_result = get_from_cache(cache_key)
+    OCR_CACHE_LOOKUPS.labels('hit' if cached_result is not None else 'miss').inc()
+    
+    if cached_result is not None:
+        # Utiliser les détections brutes en cache: aucune inférence du modèle
+        result, preprocessing_info = cached_result
         from_cache = True
         print(f"⚡ Cache HIT pour {original_filename}")
-        
-        # On a besoin des résultats OCR bruts pour dessiner les boîtes
-        # Donc on fait quand même un OCR rapide pour les boîtes
-        result = reader.readtext(filepath, paragraph=False, min_size=20, canvas_size=1280, mag_ratio=1.0)
     else:
         # Pas en cache - faire l'OCR
         print(f"🔍 OCR pour {original_filename}...")
         
-        if quick_mode:
-            ocr_input = filepath
-            result = reader.readtext(
-                ocr_input,
-                paragraph=False,
-                min_size=20,
-                text_threshold=0.6,
-                low_text=0.3,
-                link_threshold=0.3,
-                canvas_size=1280,
-                mag_ratio=1.0
-            )
-        else:
-            if use_preprocessing:
-                processed_path = os.path.join(PROCESSED_FOLDER, f"pre_{filename}")
-                preprocess_image(filepath, processed_path)
-                ocr_input = processed_path
+        # Décodage unique: le même tableau sert au prétraitement et au reader
+        with observe_stage('preprocess'):
+            image = load_image(filepath)
+            ocr_input, preprocessing_info, transform = prepare_ocr_input(image, use_preprocessing)
+        with observe_stage('readtext'):
+            params, preprocessing_info = resolve_readtext_params(ocr_input, profile_name, preprocessing_info)
+            if needs_tiling(ocr_input):
+                result, preprocessing_info = run_tiled_ocr(ocr_input, params, preprocessing_info)
             else:
-                ocr_input = filepath
-            
-            result = reader.readtext(
-                ocr_input,
-                paragraph=False,
-                min_size=10,
-                text_threshold=0.7,
-                low_text=0.4,
-                link_threshold=0.4,
-                canvas_size=2560,
-                mag_ratio=1.5
-            )
+                result = ocr_readtext(ocr_input, batch_size=OCR_BATCH_SIZE, **params)
+            # Boîtes dans le repère de l'upload (redimensionnement, redressement)
+            result = restore_coordinates(Detections.from_results(result), transform)
         
-        sorted_lines = sort_text_by_position(result)
-        ocr_text, detailed_results = format_text_output(sorted_lines, min_confidence)
-        stats = calculate_stats(detailed_results, ocr_text)
-        
-        # Sauvegarder dans le cache
-        save_to_cache(image_hash, ocr_text, stats, detailed_results)
+        # Sauvegarder dans le cache, y compris les détections sous min_confidence
+        with observe_stage('db_write'):
+            save_to_cache(cache_key, image_hash, profile_name, use_preprocessing, result, preprocessing_info)
         print(f"💾 Sauvegardé dans le cache")
     
-    # Dessiner les boîtes sur l'image
-    boxed_filename = f"boxed_{filename}"
-    boxed_path = os.path.join(PROCESSED_FOLDER, boxed_filename)
-    draw_boxes_on_image(filepath, result, boxed_path)
-    
-    # Sauvegarder dans l'historique
-    entry_id = str(uuid.uuid4())[:12]
-    save_to_history(
-        entry_id=entry_id,
-        filename=filename,
-        original_filename=original_filename,
-        text=ocr_text,
-        confidence=stats['avg_confidence'],
-        word_count=stats['word_count'],
-        char_count=stats['char_count'],
-        image_path=filepath,
-        image_hash=image_hash
+    return build_image_result(
+        filepath, filename, original_filename, image_hash, cache_key, result, min_confidence, from_cache,
+        preprocessing_info, profile_name, overlay
     )
+
+
+def process_image_batch(files, min_confidence, use_preprocessing, profile_name, overlay='image'):
+    """Traiter plusieurs images avec une inférence groupée par taille d'image
+    
+    files: liste de dicts (filepath, filename, original_filename, image_hash optionnel),
+    comme retournés par save_upload.
+    Les résultats par image sont identiques à process_single_image.
+    """
+    use_preprocessing = resolve_ocr_profile(use_preprocessing, profile_name)
+    
+    raw_results = [None] * len(files)
+    image_hashes = [None] * len(files)
+    cache_keys = [None] * len(files)
+    from_cache = [False] * len(files)
+    preprocessing_infos = [None] * len(files)
+    transforms = [None] * len(files)
+    
+    def run_bucket(size, params, bucket):
+        """Inférence groupée d'images de même taille et mêmes paramètres, mise en cache"""
+        print(f"🔍 OCR groupé: {len(bucket)} image(s) {size[0]}x{size[1]}...")
+        with observe_stage('readtext'):
+            if len(bucket) == 1:
+                bucket_results = [ocr_readtext(bucket[0][1], batch_size=OCR_BATCH_SIZE, **params)]
+            else:
+                bucket_results = ocr_readtext_batched(
+                    [ocr_input for _, ocr_input in bucket],
+                    batch_size=OCR_BATCH_SIZE,
+                    **params
+                )
+        
+        for (i, _), result in zip(bucket, bucket_results):
+            result = restore_coordinates(Detections.from_results(result), transforms[i])
+            raw_results[i] = result
+            with observe_stage('db_write'):
+                save_to_cache(
+                    cache_keys[i], image_hashes[i], profile_name, use_preprocessing, result, preprocessing_infos[i]
+                )
     
-    return {
-        'id': entry_id,
-        'filename': filename,
-        'original_filename': original_filename,
-        'text': ocr_text,
-        'stats': stats,
-        'detailed_results': detailed_results,
-        'uploaded_image': url_for('uploaded_file', filename=filename),
-        'processed_image': url_for('processed_file', filename=boxed_filename),
-        'from_cache': from_cache
-    }
+    # 1. Cache: les hits ne passent pas par le modèle
+    buckets = {}
+    pending = 0
+    first_index_by_key = {}
+    duplicates = {}
+    for i, upload in enumerate(files):
+        image_hashes[i] = upload.get('image_hash')
+        if image_hashes[i] is None:
+            with observe_stage('hash'):
+                image_hashes[i] = calculate_image_hash(upload['filepath'])
+        cache_keys[i] = build_cache_key(image_hashes[i], profile_name, use_preprocessing)
+        
+        # Même image envoyée plusieurs fois dans le lot: un seul OCR
+        if cache_keys[i] in first_index_by_key:
+            duplicates[i] = first_index_by_key[cache_keys[i]]
+            continue
+        first_index_by_key[cache_keys[i]] = i
+        
+        with observe_stage('cache_lookup'):
+            cached_result = get_from_cache(cache_keys[i])
+        OCR_CACHE_LOOKUPS.labels('hit' if cached_result is not None else 'miss').inc()
+        
+        if cached_result is not None:
+            raw_results[i], preprocessing_infos[i] = cached_result
+            from_cache[i] = True
+            print(f"⚡ Cache HIT pour {upload['original_filename']}")
+            continue
+        
+        # 2. Regrouper les images restantes par dimensions exactes (et paramètres, choisis
+        # par image en profil auto): le détecteur ne traite ensemble que des images
+        # de même taille, sans redimensionnement
+        with observe_stage('preprocess'):
+            image = load_image(upload['filepath'])
+            ocr_input, preprocessing_infos[i], transforms[i] = prepare_ocr_input(image, use_preprocessing)
+            del image
+        with observe_stage('readtext'):
+            params, preprocessing_infos[i] = resolve_readtext_params(ocr_input, profile_name, preprocessing_infos[i])
+        if needs_tiling(ocr_input):
+            # Grande image: ses tuiles forment déjà des lots, traitée tout de suite
+            with observe_stage('readtext'):
+                result, preprocessing_infos[i] = run_tiled_ocr(ocr_input, params, preprocessing_infos[i])
+                result = restore_coordinates(Detections.from_results(result), transforms[i])
+            raw_results[i] = result
+            with observe_stage('db_write'):
+                save_to_cache(
+                    cache_keys[i], image_hashes[i], profile_name, use_preprocessing, result, preprocessing_infos[i]
+                )
+            continue
+        size = (ocr_input.shape[1], ocr_input.shape[0])
+        bucket_key = (size, tuple(sorted(params.items())))
+        bucket = buckets.setdefault(bucket_key, [])
+        bucket.append((i, ocr_input))
+        pending += 1
+        del ocr_input
+        
+        # 3. Inférence dès qu'un lot est plein, ou de tous les lots en attente quand
+        # trop d'images décodées sont gardées en mémoire: un passage détecteur par lot,
+        # reconnaissance par lots de OCR_BATCH_SIZE
+        if len(bucket) >= OCR_BATCH_MAX_IMAGES:
+            run_bucket(size, params, buckets.pop(bucket_key))
+            pending -= len(bucket)
+        elif pending >= OCR_BATCH_MAX_PENDING_IMAGES:
+            for (size, params), bucket in buckets.items():
+                run_bucket(size, dict(params), bucket)
+            buckets.clear()
+            pending = 0
+        del bucket
+    
+    # Lots incomplets restants
+    for (size, params), bucket in buckets.items():
+        run_bucket(size, dict(params), bucket)
+    buckets.clear()
+    
+    for i, first_index in duplicates.items():
+        raw_results[i] = raw_results[first_index]
+        preprocessing_infos[i] = preprocessing_infos[first_index]
+        from_cache[i] = from_cache[first_index]
+    
+    return [
+        build_image_result(
+            upload['filepath'], upload['filename'], upload['original_filename'], image_hashes[i],
+            cache_keys[i], raw_results[i], min_confidence, from_cache[i], preprocessing_infos[i],
+            profile_name, overlay
+        )
+        for i, upload in enumerate(files)
+    ]
+
+
+def run_ocr_job(payload):
+    """Handler de la file de travaux: traiter les images d'un travail OCR"""
+    # url_for a besoin d'un contexte de requête, absent dans les workers
+    with app.test_request_context():
+        # Travaux mis en file avant l'ajout du champ 'profile': seulement quick_mode
+        profile_name = payload.get('profile') or ('quick' if payload.get('quick_mode') else 'full')
+        results = process_image_batch(
+            payload['files'], payload['min_confidence'], payload['use_preprocessing'], profile_name,
+            payload.get('overlay', 'image')
+        )
+    return {'results': results, 'count': len(results)}
 
 
 # ==========================================
@@ -573,7 +1433,14 @@ def uploaded_file(filename):
 
 @app.route('/processed/<filename>')
 def processed_file(filename):
-    """Servir les images traitées"""
+    """Servir les images traitées (images des boîtes dessinées au premier accès)"""
+    boxed_path = os.path.join(PROCESSED_FOLDER, filename)
+    if BOXED_FILENAME_PATTERN.match(filename):
+        if os.path.exists(boxed_path):
+            # Récemment servie: dernière évincée du dossier
+            os.utime(boxed_path)
+        elif not render_boxed_file(filename):
+            abort(404)
     return send_from_directory(
         os.path.join(os.path.dirname(__file__), '..', PROCESSED_FOLDER), 
         filename
@@ -609,21 +1476,15 @@ def index():
         # Récupérer les paramètres
         min_confidence = float(request.form.get('min_confidence', 0.3))
         use_preprocessing = request.form.get('preprocessing', 'on') == 'on'
-        quick_mode = request.form.get('quick_mode') == 'on'
-        
-        # Traiter chaque fichier
-        for file in files:
-            if file and allowed_file(file.filename):
-                original_filename = file.filename
-                filename = generate_unique_filename(original_filename)
-                filepath = os.path.join(UPLOAD_FOLDER, filename)
-                file.save(filepath)
-                
-                result = process_single_image(
-                    filepath, filename, original_filename,
-                    min_confidence, use_preprocessing, quick_mode
-                )
-                batch_results.append(result)
+        profile_name = requested_ocr_profile()
+        
+        # Enregistrer chaque fichier puis les traiter en lot
+        saved_files = [
+            save_upload(file)
+            for file in files if file and allowed_file(file.filename)
+        ]
+        
+        batch_results = process_image_batch(saved_files, min_confidence, use_preprocessing, profile_name)
         
         # Si une seule image, afficher comme avant
         from_cache = False
@@ -713,6 +1574,13 @@ def api_cache_stats():
     return jsonify(stats)
 
 
+@app.route('/api/cache/evict', methods=['POST'])
+def api_evict_cache():
+    """API: Forcer un passage d'éviction du cache OCR"""
+    evicted = evict_cache_entries()
+    return jsonify({'evicted': evicted})
+
+
 @app.route('/api/cache/clear', methods=['POST'])
 def api_clear_cache():
     """API: Vider le cache OCR"""
@@ -721,6 +1589,7 @@ def api_clear_cache():
 
 
 @app.route('/api/ocr', methods=['POST'])
+@profiling.profiled
 def api_ocr():
     """API endpoint pour l'OCR"""
     if 'file' not in request.files:
@@ -733,17 +1602,13 @@ def api_ocr():
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     os.makedirs(PROCESSED_FOLDER, exist_ok=True)
     
-    original_filename = file.filename
-    filename = generate_unique_filename(original_filename)
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
-    file.save(filepath)
-    
     min_confidence = float(request.form.get('min_confidence', 0.3))
-    quick_mode = request.form.get('quick_mode') == 'on'
+    profile_name = requested_ocr_profile()
     
+    upload = save_upload(file)
     result = process_single_image(
-        filepath, filename, original_filename,
-        min_confidence, False, quick_mode
+        upload['filepath'], upload['filename'], upload['original_filename'],
+        min_confidence, False, profile_name, image_hash=upload['image_hash'], overlay=requested_overlay_mode()
     )
     
     return jsonify(result)
@@ -763,41 +1628,163 @@ def api_batch_ocr():
     os.makedirs(PROCESSED_FOLDER, exist_ok=True)
     
     min_confidence = float(request.form.get('min_confidence', 0.3))
-    quick_mode = request.form.get('quick_mode') == 'on'
+    profile_name = requested_ocr_profile()
     
-    results = []
-    for file in files:
-        if file and allowed_file(file.filename):
-            original_filename = file.filename
-            filename = generate_unique_filename(original_filename)
-            filepath = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(filepath)
-            
-            result = process_single_image(
-                filepath, filename, original_filename,
-                min_confidence, False, quick_mode
-            )
-            results.append(result)
+    saved_files = [
+        save_upload(file)
+        for file in files if file and allowed_file(file.filename)
+    ]
+    
+    results = process_image_batch(saved_files, min_confidence, False, profile_name, requested_overlay_mode())
     
     return jsonify({'results': results, 'count': len(results)})
 
 
+@app.route('/api/jobs', methods=['POST'])
+def api_submit_job():
+    """API: Soumettre un travail OCR asynchrone (une ou plusieurs images)"""
+    files = request.files.getlist('files') or request.files.getlist('file')
+    files = [file for file in files if file and allowed_file(file.filename)]
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+    
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    os.makedirs(PROCESSED_FOLDER, exist_ok=True)
+    
+    profile_name = requested_ocr_profile()
+    saved_files = [save_upload(file) for file in files]
+    
+    job_id = enqueue_job('ocr', {
+        'files': saved_files,
+        'min_confidence': float(request.form.get('min_confidence', 0.3)),
+        'use_preprocessing': False,
+        'profile': profile_name,
+        'overlay': requested_overlay_mode()
+    })
+    job_workers.notify()
+    
+    return jsonify({
+        'job_id': job_id,
+        'status': JOB_QUEUED,
+        'status_url': url_for('api_get_job', job_id=job_id)
+    }), 202
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def api_get_job(job_id):
+    """API: Statut (et résultats une fois terminé) d'un travail OCR"""
+    job = get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    response = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'file_count': len(job['payload']['files']),
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at']
+    }
+    if job['status'] == JOB_DONE:
+        response.update(job['result'])
+    elif job['error']:
+        response['error'] = job['error']
+    
+    return jsonify(response)
+
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    HTTP_IN_FLIGHT.inc()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Compter et chronométrer chaque requête (route, pas l'URL: cardinalité bornée)"""
+    if 'request_start' in g:
+        path = request.url_rule.rule if request.url_rule else 'unmatched'
+        status = str(response.status_code)
+        HTTP_REQUESTS.labels(request.method, status).inc()
+        HTTP_REQUEST_DURATION.labels(request.method, path, status).observe(time.perf_counter() - g.request_start)
+    return response
+
+
+@app.teardown_request
+def finish_request_metrics(exception=None):
+    if 'request_start' in g:
+        HTTP_IN_FLIGHT.dec()
+
+
+@app.route('/metrics')
+def metrics():
+    """Métriques Prometheus (requêtes HTTP, étapes de l'OCR, cache)"""
+    if not PROMETHEUS_AVAILABLE:
+        return jsonify({'error': 'prometheus_client non installé'}), 503
+    body, content_type = render_metrics()
+    return body, 200, {'Content-Type': content_type}
+
+
+@app.route('/healthz')
+def healthz():
+    """Sonde de vie: le processus répond (ni base, ni modèle)"""
+    return jsonify({'status': 'ok'})
+
+
+@app.route('/readyz')
+def readyz():
+    """Sonde de disponibilité: modèle OCR chargé (sauf MODEL_LOADING=lazy), base
+    joignable et file de travaux sous READY_MAX_QUEUE_DEPTH
+    """
+    model_status = ocr_backend_status()
+    checks = check_dependencies()
+    queued = checks['queue'][JOB_QUEUED] if checks['queue'] else None
+    
+    ready = (
+        (model_status == 'ready' or MODEL_LOADING == 'lazy')
+        and checks['database'] == 'ok'
+        and (READY_MAX_QUEUE_DEPTH <= 0 or queued <= READY_MAX_QUEUE_DEPTH)
+    )
+    response = {
+        'status': 'ready' if ready else 'not_ready',
+        'model': model_status,
+        'database': checks['database'],
+        'queue': checks['queue']
+    }
+    if _backend_error:
+        response['error'] = _backend_error
+    return jsonify(response), 200 if ready else 503
+
+
 # ==========================================
 # INITIALISATION AU DÉMARRAGE
 # ==========================================
 
-# Initialiser la base de données
-init_database()
+if not IS_OCR_POOL_CHILD:
+    # Initialiser la base de données
+    db.configure(DATABASE_FILE, DB_POOL_SIZE, DB_BUSY_TIMEOUT_MS)
+    profiling.configure(
+        PROFILING_TOKENS, PROFILING_MODE, PROFILES_FOLDER, PROFILES_MAX_FILES, PROFILING_SAMPLE_INTERVAL_MS
+    )
+    init_database()
+    init_jobs_table()
+
+    # Créer les dossiers
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    os.makedirs(PROCESSED_FOLDER, exist_ok=True)
 
-# Créer les dossiers
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(PROCESSED_FOLDER, exist_ok=True)
+    # Démarrer le nettoyage automatique (premier passage dans le thread du scheduler)
+    start_cleanup_scheduler()
 
-# Démarrer le nettoyage automatique
-start_cleanup_scheduler()
+    # Démarrer les workers de la file de travaux OCR
+    job_workers = JobWorkerPool({'ocr': run_ocr_job}, JOB_WORKERS, JOB_POLL_INTERVAL_SECONDS)
+    job_workers.start()
 
-# Premier nettoyage au démarrage
-cleanup_old_files()
+    # Charger le modèle OCR (Reader local ou un Reader par worker du pool)
+    if MODEL_LOADING == 'eager':
+        load_ocr_backend()
+    elif MODEL_LOADING == 'background':
+        start_model_warmup()
 
 
 # ==========================================
@@ -807,11 +1794,13 @@ cleanup_old_files()
 if __name__ == "__main__":
     print("=" * 50)
     print("🔍 EdiScan - OCR Intelligent")
-    print(f"🖥️  GPU CUDA: {'✅ Activé' if GPU_AVAILABLE else '❌ Désactivé (CPU)'}")
+    print(f"🧠 Modèle OCR: {MODEL_LOADING_LABELS[MODEL_LOADING]}")
     print(f"🌐 Langues: Français, Anglais")
+    print(f"⚙️  Workers OCR: {OCR_WORKERS if OCR_WORKERS > 0 else 'Reader local'}")
     print(f"📦 Base de données: {DATABASE_FILE}")
     print(f"🧹 Nettoyage auto: fichiers > {MAX_FILE_AGE_HOURS}h")
     print(f"🛠️  Outils: {'✅ Activés' if TOOLS_AVAILABLE else '❌ Désactivés'}")
+    print(f"🔬 Profilage: {PROFILING_MODE if PROFILING_TOKENS else 'désactivé'}")
     print(f"🐳 Mode: {'Production' if not DEBUG else 'Développement'}")
     print(f"🌐 Serveur: http://{HOST}:{PORT}")
     print("=" * 50)
@@ -0,0 +1,85 @@
+"""
+EdiScan - Data access layer
+Pool de connexions SQLite partagé (historique, cache, ...)
+"""
+
+import queue
+import sqlite3
+from contextlib import contextmanager
+
+# Pragmas appliqués à chaque nouvelle connexion
+# - WAL: les lectures ne bloquent plus les écritures (et inversement)
+# - synchronous=NORMAL: pas de fsync à chaque commit en mode WAL
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA mmap_size=134217728',
+)
+
+# Requêtes préparées gardées en cache par connexion
+STATEMENT_CACHE_SIZE = 128
+
+_database_file = 'ediscan.db'
+_busy_timeout = 5.0
+_pool = queue.LifoQueue(maxsize=8)
+
+
+def configure(database_file, pool_size=8, busy_timeout_ms=5000):
+    """Configurer la base et la taille du pool (avant la première connexion)"""
+    global _database_file, _busy_timeout, _pool
+    close_all()
+    _database_file = database_file
+    _busy_timeout = busy_timeout_ms / 1000
+    _pool = queue.LifoQueue(maxsize=pool_size)
+
+
+def _create_connection():
+    """Ouvrir une connexion configurée (pragmas, Row, cache de requêtes)"""
+    conn = sqlite3.connect(
+        _database_file,
+        timeout=_busy_timeout,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+@contextmanager
+def connection():
+    """Emprunter une connexion du pool (un seul thread à la fois)"""
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _create_connection()
+
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            _pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+@contextmanager
+def transaction():
+    """Connexion du pool dans une transaction (commit, ou rollback si erreur)"""
+    with connection() as conn:
+        with conn:
+            yield conn
+
+
+def close_all():
+    """Fermer toutes les connexions inactives du pool"""
+    while True:
+        try:
+            _pool.get_nowait().close()
+        except queue.Empty:
+            break
@@ -0,0 +1,104 @@
+"""
+EdiScan - Detections
+Conteneur compact des détections OCR (tableau structuré NumPy + textes)
+et sérialisation binaire pour le cache
+"""
+
+import struct
+import sys
+
+import numpy as np
+
+# Une détection: quadrilatère (4 points x, y) et confiance
+DETECTION_DTYPE = np.dtype([('bbox', '<f4', (4, 2)), ('confidence', '<f8')])
+
+# En-tête binaire: signature, nombre de détections
+_MAGIC = b'EDT1'
+_HEADER = struct.Struct('<4sI')
+
+
+class Detections:
+    """Détections brutes d'une image, itérables comme le résultat de reader.readtext
+
+    records: tableau structuré DETECTION_DTYPE, texts: liste des textes (même ordre).
+    """
+
+    __slots__ = ('records', 'texts')
+
+    def __init__(self, records, texts):
+        self.records = records
+        self.texts = list(texts)
+
+    @classmethod
+    def from_results(cls, ocr_results):
+        """Construire depuis une liste (bbox, texte, confiance); un Detections est rendu tel quel"""
+        if isinstance(ocr_results, cls):
+            return ocr_results
+        ocr_results = list(ocr_results)
+        records = np.empty(len(ocr_results), dtype=DETECTION_DTYPE)
+        if ocr_results:
+            records['bbox'] = np.array([bbox for (bbox, _, _) in ocr_results], dtype=np.float32).reshape(-1, 4, 2)
+            records['confidence'] = [confidence for (_, _, confidence) in ocr_results]
+        return cls(records, [text for (_, text, _) in ocr_results])
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Relire la forme binaire produite par to_bytes (sans copie des tableaux)"""
+        data = memoryview(data)
+        magic, count = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("Format de détections inconnu")
+        offset = _HEADER.size
+        records = np.frombuffer(data, dtype=DETECTION_DTYPE, count=count, offset=offset)
+        offset += records.nbytes
+        lengths = np.frombuffer(data, dtype='<u4', count=count, offset=offset)
+        offset += lengths.nbytes
+        # Longueurs en octets: découper le blob encodé avant de décoder
+        text_blob = bytes(data[offset:])
+        bounds = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]).tolist()
+        texts = [text_blob[start:end].decode('utf-8') for start, end in zip(bounds[:-1], bounds[1:])]
+        return cls(records, texts)
+
+    def to_bytes(self):
+        """Forme binaire: en-tête, enregistrements, longueurs des textes, textes UTF-8"""
+        encoded = [text.encode('utf-8') for text in self.texts]
+        lengths = np.array([len(text) for text in encoded], dtype='<u4')
+        return b''.join([
+            _HEADER.pack(_MAGIC, len(self.records)),
+            np.ascontiguousarray(self.records).tobytes(),
+            lengths.tobytes(),
+            *encoded
+        ])
+
+    @property
+    def boxes(self):
+        """Quadrilatères (n, 4, 2) en float32"""
+        return self.records['bbox']
+
+    @property
+    def confidences(self):
+        """Confiances (n,) en float64"""
+        return self.records['confidence']
+
+    @property
+    def nbytes(self):
+        """Taille mémoire estimée (tableau + chaînes Python)"""
+        return self.records.nbytes + sum(sys.getsizeof(text) for text in self.texts)
+
+    def with_boxes(self, boxes):
+        """Mêmes détections avec d'autres quadrilatères (changement de repère)"""
+        records = self.records.copy()
+        records['bbox'] = boxes
+        return Detections(records, self.texts)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        record = self.records[index]
+        return record['bbox'].tolist(), self.texts[index], float(record['confidence'])
+
+    def __iter__(self):
+        boxes = self.boxes.tolist()
+        confidences = self.confidences.tolist()
+        return iter(zip(boxes, self.texts, confidences))
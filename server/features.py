@@ -7,6 +7,7 @@ import os
 import re
 import io
 import base64
+from importlib.util import find_spec
 from PIL import Image
 
 # PDF
@@ -39,13 +40,9 @@ try:
 except ImportError:
     QR_AVAILABLE = False
 
-# Audio
-try:
-    import whisper
-    WHISPER_AVAILABLE = True
-    whisper_model = None
-except ImportError:
-    WHISPER_AVAILABLE = False
+# Audio (whisper pulls in torch: imported on first transcription)
+WHISPER_AVAILABLE = find_spec('whisper') is not None
+whisper_model = None
 
 # Text-to-Speech
 try:
@@ -54,19 +51,8 @@ try:
 except ImportError:
     TTS_AVAILABLE = False
 
-# Summary
-try:
-    from sumy.parsers.plaintext import PlaintextParser
-    from sumy.nlp.tokenizers import Tokenizer
-    from sumy.summarizers.lsa import LsaSummarizer
-    import nltk
-    try:
-        nltk.data.find('tokenizers/punkt')
-    except LookupError:
-        nltk.download('punkt', quiet=True)
-    SUMMARY_AVAILABLE = True
-except ImportError:
-    SUMMARY_AVAILABLE = False
+# Summary (sumy and nltk imported, punkt downloaded, on first summary)
+SUMMARY_AVAILABLE = find_spec('sumy') is not None and find_spec('nltk') is not None
 
 # Phone numbers
 try:
@@ -248,8 +234,9 @@ def transcribe_audio(audio_path, language='fr'):
         return None, "Whisper not installed"
     
     try:
-        # Load model on first use
+        # Import and load model on first use
         if whisper_model is None:
+            import whisper
             whisper_model = whisper.load_model("base")
         
         result = whisper_model.transcribe(audio_path, language=language)
@@ -281,12 +268,26 @@ def text_to_speech(text, language='fr', filename='speech.mp3'):
 # Summary Functions
 # ==========================================
 
+def _ensure_punkt():
+    """Download the nltk sentence tokenizer on first use"""
+    import nltk
+    try:
+        nltk.data.find('tokenizers/punkt')
+    except LookupError:
+        nltk.download('punkt', quiet=True)
+
+
 def summarize_text(text, sentences_count=5):
     """Summarize text to key sentences"""
     if not SUMMARY_AVAILABLE:
         return None, "Summary not installed"
     
     try:
+        from sumy.parsers.plaintext import PlaintextParser
+        from sumy.nlp.tokenizers import Tokenizer
+        from sumy.summarizers.lsa import LsaSummarizer
+        _ensure_punkt()
+        
         parser = PlaintextParser.from_string(text, Tokenizer("french"))
         summarizer = LsaSummarizer()
         
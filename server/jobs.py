@@ -0,0 +1,201 @@
+"""
+EdiScan - Job queue
+File de travaux persistante (SQLite) et pool de workers en arrière-plan
+"""
+
+import json
+import threading
+import time
+import traceback
+import uuid
+
+import db
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_ERROR = 'error'
+
+# Écriture du résultat: essais avant d'abandonner (le travail reste "running"
+# et sera remis en file au prochain démarrage)
+FINISH_ATTEMPTS = 5
+
+
+def init_jobs_table():
+    """Créer la table des travaux et reprendre ceux interrompus par un arrêt"""
+    with db.transaction() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT,
+                result TEXT,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)')
+
+        # Un travail "running" au démarrage a été interrompu: on le remet en file
+        cursor.execute('''
+            UPDATE jobs SET status = ?, started_at = NULL
+            WHERE status = ?
+        ''', (JOB_QUEUED, JOB_RUNNING))
+        if cursor.rowcount:
+            print(f"📋 {cursor.rowcount} travaux interrompus remis en file")
+
+
+def enqueue_job(kind, payload):
+    """Ajouter un travail à la file et retourner son identifiant"""
+    job_id = uuid.uuid4().hex[:16]
+    with db.transaction() as conn:
+        conn.execute('''
+            INSERT INTO jobs (id, kind, status, payload)
+            VALUES (?, ?, ?, ?)
+        ''', (job_id, kind, JOB_QUEUED, json.dumps(payload)))
+    return job_id
+
+
+def get_job(job_id):
+    """Récupérer un travail (payload et résultat décodés)"""
+    with db.connection() as conn:
+        row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+
+    return _decode_job(row) if row else None
+
+
+def _decode_job(row):
+    job = dict(row)
+    job['payload'] = json.loads(job['payload']) if job['payload'] else None
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+def claim_next_job():
+    """Réserver le plus ancien travail en attente (None si la file est vide)"""
+    with db.transaction() as conn:
+        row = conn.execute('''
+            SELECT * FROM jobs WHERE status = ?
+            ORDER BY created_at ASC
+            LIMIT 1
+        ''', (JOB_QUEUED,)).fetchone()
+        if not row:
+            return None
+
+        # Mise à jour conditionnelle: un seul worker peut réserver le travail
+        cursor = conn.execute('''
+            UPDATE jobs SET status = ?, started_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = ?
+        ''', (JOB_RUNNING, row['id'], JOB_QUEUED))
+        if cursor.rowcount != 1:
+            return None
+
+    # Travail lu dans la même transaction: pas de travail réservé sans worker
+    job = _decode_job(row)
+    job['status'] = JOB_RUNNING
+    return job
+
+
+def finish_job(job_id, result=None, error=None):
+    """Enregistrer le résultat (ou l'erreur) d'un travail"""
+    with db.transaction() as conn:
+        conn.execute('''
+            UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (
+            JOB_ERROR if error else JOB_DONE,
+            json.dumps(result) if result is not None else None,
+            error,
+            job_id
+        ))
+
+
+def get_queue_depth():
+    """Nombre de travaux en attente et en cours"""
+    with db.connection() as conn:
+        rows = conn.execute('''
+            SELECT status, COUNT(*) AS count FROM jobs
+            WHERE status IN (?, ?)
+            GROUP BY status
+        ''', (JOB_QUEUED, JOB_RUNNING)).fetchall()
+
+    depth = {JOB_QUEUED: 0, JOB_RUNNING: 0}
+    depth.update({row['status']: row['count'] for row in rows})
+    return depth
+
+
+def purge_finished_jobs(max_age_hours):
+    """Supprimer les travaux terminés depuis plus de max_age_hours"""
+    with db.transaction() as conn:
+        cursor = conn.execute('''
+            DELETE FROM jobs
+            WHERE status IN (?, ?) AND finished_at < datetime('now', ?)
+        ''', (JOB_DONE, JOB_ERROR, f'-{max_age_hours} hours'))
+        return cursor.rowcount
+
+
+class JobWorkerPool:
+    """Threads qui vident la file de travaux avec les handlers par type"""
+
+    def __init__(self, handlers, num_workers=1, poll_interval=1.0):
+        self.handlers = handlers
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Démarrer les workers"""
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._worker_loop, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"📋 File de travaux: {self.num_workers} worker(s)")
+
+    def notify(self):
+        """Réveiller les workers après un ajout dans la file"""
+        self._wakeup.set()
+
+    def _worker_loop(self):
+        while True:
+            try:
+                job = claim_next_job()
+                if job is None:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    continue
+                self._run(job)
+            except Exception:
+                # Base verrouillée (contention WAL), ...: le worker reprend après une pause
+                traceback.print_exc()
+                self._wakeup.wait(self.poll_interval)
+
+    def _run(self, job):
+        handler = self.handlers.get(job['kind'])
+        if handler is None:
+            self._finish(job['id'], error=f"Type de travail inconnu: {job['kind']}")
+            return
+
+        try:
+            result = handler(job['payload'])
+        except Exception as e:
+            traceback.print_exc()
+            self._finish(job['id'], error=str(e))
+        else:
+            self._finish(job['id'], result=result)
+
+    def _finish(self, job_id, result=None, error=None):
+        """finish_job avec nouveaux essais: un travail terminé ne doit pas rester en cours"""
+        for attempt in range(FINISH_ATTEMPTS):
+            try:
+                finish_job(job_id, result=result, error=error)
+                return
+            except Exception as e:
+                print(f"⚠️ Résultat du travail {job_id} non enregistré ({attempt + 1}/{FINISH_ATTEMPTS}): {e}")
+                time.sleep(self.poll_interval * (attempt + 1))
+        print(f"❌ Travail {job_id} laissé en cours, remis en file au prochain démarrage")
@@ -0,0 +1,234 @@
+"""
+EdiScan - Layout
+Ordre de lecture des détections OCR: lignes par recouvrement vertical, colonnes
+"""
+
+import numpy as np
+
+from detections import Detections
+
+# Deux boîtes sont sur la même ligne si leurs hauteurs se recouvrent au moins à moitié
+LINE_OVERLAP_RATIO = 0.5
+# Pente max (dy/dx) attribuée à une ligne de texte inclinée
+MAX_TEXT_SLOPE = 0.2
+# Gouttière entre colonnes: au moins 1.5 hauteur de texte de large...
+MIN_GUTTER_HEIGHTS = 1.5
+# ...et traversée par au plus 5% des boîtes, ou 2 (titre et pied de page sur toute la largeur)
+MAX_GUTTER_CROSSING_RATIO = 0.05
+MIN_GUTTER_CROSSINGS = 2
+# Colonnes de texte: lignes d'un côté alignées avec l'autre côté sous ce taux...
+MAX_COLUMN_ALIGNMENT = 0.5
+# ...ou boîtes couvrant la largeur de leur colonne (paragraphes, pas cellules de tableau)
+MIN_COLUMN_FILL = 0.6
+MIN_COLUMN_LINES = 3
+MAX_TEXT_GUTTER_HEIGHTS = 3.0
+# Profondeur max du découpage en colonnes
+MAX_DEPTH = 4
+# Partie linéaire des rotations horaires de normalize_orientation (la translation
+# ne change pas l'ordre de lecture)
+_ROTATIONS = {
+    0: np.eye(2),
+    90: np.array([[0.0, -1.0], [1.0, 0.0]]),
+    180: np.array([[-1.0, 0.0], [0.0, -1.0]]),
+    270: np.array([[0.0, 1.0], [-1.0, 0.0]]),
+}
+
+
+class _Geometry:
+    """Géométrie des boîtes sous forme de tableaux (une valeur par détection)"""
+
+    def __init__(self, points):
+        # points: (n, 4, 2)
+        xs, ys = points[:, :, 0], points[:, :, 1]
+        self.left = xs.min(axis=1)
+        self.right = xs.max(axis=1)
+        self.center_x = xs.mean(axis=1)
+        self.top_y = ys.min(axis=1)
+        self.height = ys.max(axis=1) - self.top_y
+
+        # Pente commune des lignes (bord haut des boîtes assez larges): le
+        # regroupement se fait sur des ordonnées corrigées de cette pente
+        dx = points[:, 1, 0] - points[:, 0, 0]
+        dy = points[:, 1, 1] - points[:, 0, 1]
+        wide = dx > np.maximum(self.height, 1.0)
+        slope = float(np.median(dy[wide] / dx[wide])) if wide.any() else 0.0
+        slope = float(np.clip(slope, -MAX_TEXT_SLOPE, MAX_TEXT_SLOPE))
+        shift = slope * (self.center_x - self.center_x.min())
+        self.top = self.top_y - shift
+        self.bottom = ys.max(axis=1) - shift
+        self.middle = (self.top + self.bottom) / 2
+
+        heights = self.height[self.height > 0]
+        self.text_height = float(np.median(heights)) if heights.size else 1.0
+
+
+def _group_lines(indices, geometry):
+    """Regrouper des boîtes en lignes (recouvrement vertical), chaque ligne de gauche à droite"""
+    if indices.size == 0:
+        return []
+    order = indices[np.argsort(geometry.middle[indices], kind='stable')]
+    top = geometry.top[order]
+    bottom = geometry.bottom[order]
+    height = np.maximum(bottom - top, 1.0)
+
+    # Nouvelle ligne quand la boîte recouvre moins de la moitié de sa hauteur
+    # le bas le plus bas des boîtes précédentes
+    previous_bottom = np.concatenate([[-np.inf], np.maximum.accumulate(bottom)[:-1]])
+    new_line = (previous_bottom - top) < LINE_OVERLAP_RATIO * height
+    line_ids = np.cumsum(new_line)
+
+    # Un seul tri (ligne, x) puis découpage aux changements de ligne
+    order = order[np.lexsort((geometry.center_x[order], line_ids))]
+    return np.split(order, np.flatnonzero(np.diff(np.sort(line_ids))) + 1)
+
+
+def _find_gutter(indices, geometry):
+    """Plus large bande verticale vide entre deux groupes de boîtes: (x0, x1) ou None"""
+    left = np.floor(geometry.left[indices]).astype(np.int64)
+    right = np.ceil(geometry.right[indices]).astype(np.int64)
+    origin = left.min()
+    width = right.max() - origin
+    if width <= 0:
+        return None
+
+    # Nombre de boîtes couvrant chaque colonne de pixels (tableau de différences)
+    coverage = np.zeros(width + 1, dtype=np.int64)
+    np.add.at(coverage, left - origin, 1)
+    np.add.at(coverage, right - origin, -1)
+    coverage = np.cumsum(coverage)[:-1]
+
+    allowed = max(MIN_GUTTER_CROSSINGS, int(indices.size * MAX_GUTTER_CROSSING_RATIO))
+    free = np.concatenate([[0], (coverage <= allowed).astype(np.int8), [0]])
+    edges = np.flatnonzero(np.diff(free))
+    starts, ends = edges[::2], edges[1::2]
+    # Pas les marges: la bande doit avoir du texte des deux côtés
+    interior = (starts > 0) & (ends < width)
+    starts, ends = starts[interior], ends[interior]
+    if starts.size == 0:
+        return None
+
+    best = int(np.argmax(ends - starts))
+    if ends[best] - starts[best] < MIN_GUTTER_HEIGHTS * geometry.text_height:
+        return None
+    return float(starts[best] + origin), float(ends[best] + origin)
+
+
+def _is_column_split(left_ids, right_ids, gutter, geometry):
+    """Les deux côtés d'une gouttière sont-ils des colonnes de texte (et non un tableau)?"""
+    left_lines = _group_lines(left_ids, geometry)
+    right_lines = _group_lines(right_ids, geometry)
+
+    # Lignes du côté le plus court ayant une ligne alignée de l'autre côté
+    short, other = sorted([left_lines, right_lines], key=len)
+    other_top = np.array([geometry.top[line].min() for line in other])
+    other_bottom = np.array([geometry.bottom[line].max() for line in other])
+    aligned = 0
+    for line in short:
+        top, bottom = geometry.top[line].min(), geometry.bottom[line].max()
+        overlap = np.minimum(bottom, other_bottom) - np.maximum(top, other_top)
+        if np.any(overlap >= LINE_OVERLAP_RATIO * (bottom - top)):
+            aligned += 1
+    if aligned / len(short) < MAX_COLUMN_ALIGNMENT:
+        return True
+
+    # Lignes alignées: colonnes de paragraphes si les boîtes remplissent leur
+    # colonne et que la gouttière est étroite, sinon tableau lu ligne par ligne
+    if min(len(left_lines), len(right_lines)) < MIN_COLUMN_LINES:
+        return False
+    if gutter[1] - gutter[0] > MAX_TEXT_GUTTER_HEIGHTS * geometry.text_height:
+        return False
+    for ids in (left_ids, right_ids):
+        extent = geometry.right[ids].max() - geometry.left[ids].min()
+        widths = geometry.right[ids] - geometry.left[ids]
+        if extent <= 0 or np.median(widths) < MIN_COLUMN_FILL * extent:
+            return False
+    return True
+
+
+def _reading_order(indices, geometry, depth=0):
+    """Lignes dans l'ordre de lecture: bandes horizontales, puis colonnes de gauche à droite"""
+    gutter = _find_gutter(indices, geometry) if depth < MAX_DEPTH and indices.size > 1 else None
+    if gutter is None:
+        return _group_lines(indices, geometry)
+
+    # Les boîtes qui traversent la gouttière (titres) découpent la page en bandes
+    crossing = (geometry.left[indices] < gutter[0]) & (geometry.right[indices] > gutter[1])
+    spanning = indices[crossing]
+    spanning = spanning[np.argsort(geometry.top[spanning], kind='stable')]
+    others = indices[~crossing]
+
+    lines = []
+    band_top = -np.inf
+    for span in list(spanning) + [None]:
+        band_bottom = geometry.middle[span] if span is not None else np.inf
+        in_band = (geometry.middle[others] >= band_top) & (geometry.middle[others] < band_bottom)
+        band = others[in_band]
+        if band.size:
+            on_left = geometry.center_x[band] < (gutter[0] + gutter[1]) / 2
+            left_ids, right_ids = band[on_left], band[~on_left]
+            if left_ids.size and right_ids.size and _is_column_split(left_ids, right_ids, gutter, geometry):
+                lines.extend(_reading_order(left_ids, geometry, depth + 1))
+                lines.extend(_reading_order(right_ids, geometry, depth + 1))
+            else:
+                lines.extend(_group_lines(band, geometry))
+        if span is not None:
+            lines.append(np.array([span], dtype=np.intp))
+        band_top = band_bottom
+    return lines
+
+
+def _to_reading_frame(points, rotation):
+    """Quadrilatères tournés dans le repère du texte à l'endroit, coin haut-gauche en premier"""
+    if not rotation:
+        return points
+    points = points @ _ROTATIONS[rotation].T
+    first = np.argmin(points.sum(axis=2), axis=1)
+    order = (first[:, None] + np.arange(4)) % 4
+    return np.take_along_axis(points, order[:, :, None], axis=1)
+
+
+def sort_text_by_position(ocr_results, rotation=0):
+    """Ordre de lecture des résultats OCR (Detections ou liste readtext)
+
+    rotation: rotation horaire (0, 90, 180, 270) qui remet le texte à l'endroit
+    (infos de normalize_orientation); l'ordre est calculé dans ce repère.
+
+    Retourne une liste de lignes, chacune un tableau d'indices des détections
+    de gauche à droite.
+    """
+    detections = Detections.from_results(ocr_results)
+    if not len(detections):
+        return []
+
+    points = detections.boxes.astype(np.float64)
+    geometry = _Geometry(_to_reading_frame(points, rotation))
+    return _reading_order(np.arange(len(detections)), geometry)
+
+
+def format_text_output(detections, lines, min_confidence=0.3):
+    """Formater le texte extrait (lignes d'indices de sort_text_by_position)"""
+    texts = detections.texts
+    confidences = detections.confidences
+    output_lines = []
+    kept_lines = []
+
+    for line in lines:
+        kept = line[confidences[line] >= min_confidence]
+        if kept.size:
+            kept_lines.append(kept)
+            output_lines.append(' '.join([texts[i] for i in kept.tolist()]))
+
+    if not kept_lines:
+        return '\n'.join(output_lines), []
+
+    order = np.concatenate(kept_lines)
+    boxes = detections.boxes[order].astype(np.int64).tolist()
+    detailed_results = [
+        {
+            'text': texts[i],
+            'confidence': round(confidence * 100, 1),
+            'bbox': bbox
+        }
+        for i, confidence, bbox in zip(order.tolist(), confidences[order].tolist(), boxes)
+    ]
+    return '\n'.join(output_lines), detailed_results
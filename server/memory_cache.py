@@ -0,0 +1,80 @@
+"""
+EdiScan - In-memory LRU cache
+Niveau mémoire devant la table SQLite ocr_cache
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Cache LRU borné en nombre d'entrées et en octets, thread-safe"""
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Récupérer une valeur (None si absente) et la marquer récente"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        """Ajouter une valeur de taille estimée `size` octets"""
+        if self.max_entries <= 0 or size > self.max_bytes:
+            # Désactivé, ou valeur trop grosse pour le cache
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._current_bytes -= old[1]
+
+            self._entries[key] = (value, size)
+            self._current_bytes += size
+
+            while (len(self._entries) > self.max_entries
+                   or self._current_bytes > self.max_bytes):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._current_bytes -= evicted_size
+                self.evictions += 1
+
+    def discard(self, key):
+        """Retirer une entrée si elle existe"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._current_bytes -= entry[1]
+
+    def clear(self):
+        """Vider le cache (les compteurs sont conservés)"""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def stats(self):
+        """Statistiques du cache mémoire"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._current_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups * 100, 1) if lookups else 0
+            }
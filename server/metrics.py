@@ -0,0 +1,100 @@
+"""
+EdiScan - Metrics
+Métriques Prometheus (/metrics): requêtes HTTP et durée de chaque étape de l'OCR
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+# Étapes mesurées de l'OCR d'une image
+OCR_STAGES = ('hash', 'cache_lookup', 'preprocess', 'readtext', 'sort_format', 'draw_boxes', 'db_write')
+
+# Bornes des histogrammes (secondes): de la lecture du cache à l'OCR d'une grande page
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class _NoopMetric:
+    """Métrique sans effet quand prometheus_client n'est pas installé"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+if PROMETHEUS_AVAILABLE:
+    # Mêmes noms que prometheus_flask_exporter: utilisés par le dashboard et les alertes
+    HTTP_REQUESTS = Counter(
+        'flask_http_request_total', 'Requêtes HTTP traitées', ['method', 'status']
+    )
+    HTTP_REQUEST_DURATION = Histogram(
+        'flask_http_request_duration_seconds', 'Durée des requêtes HTTP', ['method', 'path', 'status'],
+        buckets=HTTP_BUCKETS
+    )
+    HTTP_IN_FLIGHT = Gauge('ediscan_http_requests_in_flight', 'Requêtes HTTP en cours')
+    OCR_STAGE_DURATION = Histogram(
+        'ediscan_ocr_stage_duration_seconds', "Durée de chaque étape de l'OCR", ['stage'],
+        buckets=STAGE_BUCKETS
+    )
+    OCR_CACHE_LOOKUPS = Counter('ediscan_ocr_cache_lookups_total', 'Lectures du cache OCR', ['result'])
+    OCR_IMAGES = Counter('ediscan_ocr_images_total', 'Images traitées par profil OCR', ['profile'])
+    OCR_BYTES = Counter('ediscan_ocr_bytes_processed_total', 'Octets des images reçues')
+else:
+    HTTP_REQUESTS = HTTP_REQUEST_DURATION = HTTP_IN_FLIGHT = _NoopMetric()
+    OCR_STAGE_DURATION = OCR_CACHE_LOOKUPS = OCR_IMAGES = OCR_BYTES = _NoopMetric()
+
+# Relevé des étapes de la requête en cours (profilage), None hors collect_stages
+_stage_timings = ContextVar('stage_timings', default=None)
+
+
+@contextmanager
+def collect_stages():
+    """Relever aussi les étapes exécutées dans ce contexte: {étape: count, wall, cpu}"""
+    timings = {}
+    token = _stage_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _stage_timings.reset(token)
+
+
+@contextmanager
+def observe_stage(stage):
+    """Mesurer la durée d'une étape de l'OCR (histogramme par étape)
+
+    Dans collect_stages, le temps réel et le temps CPU du thread courant
+    s'ajoutent au relevé de l'étape.
+    """
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        OCR_STAGE_DURATION.labels(stage).observe(elapsed)
+        timings = _stage_timings.get()
+        if timings is not None:
+            entry = timings.setdefault(stage, {'count': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0})
+            entry['count'] += 1
+            entry['wall_seconds'] += elapsed
+            entry['cpu_seconds'] += time.thread_time() - cpu_start
+
+
+def render_metrics():
+    """Corps et type de contenu de la réponse /metrics"""
+    return generate_latest(), CONTENT_TYPE_LATEST
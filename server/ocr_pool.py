@@ -0,0 +1,90 @@
+"""
+EdiScan - OCR worker pool
+Pool de processus, chacun avec son propre easyocr.Reader
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Reader du processus worker (chargé une seule fois par _init_worker)
+_worker_reader = None
+
+
+def _init_worker(languages, gpu, model_directory, torch_threads):
+    """Initialiser un worker: threads torch puis chargement du Reader"""
+    global _worker_reader
+    import torch
+    import easyocr
+
+    torch.set_num_threads(torch_threads)
+    _worker_reader = easyocr.Reader(
+        languages,
+        gpu=gpu,
+        model_storage_directory=model_directory,
+        download_enabled=True
+    )
+
+
+def _wait_for_peers(barrier):
+    # Bloque chaque worker tant que tous ne sont pas démarrés
+    barrier.wait()
+    return os.getpid()
+
+
+def _readtext(image, params):
+    return _worker_reader.readtext(image, **params)
+
+
+def _readtext_batched(images, params):
+    return _worker_reader.readtext_batched(images, **params)
+
+
+def _detect(image, params):
+    return _worker_reader.detect(image, **params)
+
+
+class OCRWorkerPool:
+    """Pool de N processus OCR, les threads CPU de torch étant répartis entre eux"""
+
+    def __init__(self, num_workers, languages, gpu=False, model_directory='models', torch_threads=0):
+        self.num_workers = num_workers
+        cpu_count = os.cpu_count() or 1
+        self.torch_threads = torch_threads or max(1, cpu_count // num_workers)
+
+        # spawn: un fork après l'import de torch n'est pas sûr
+        self._mp_context = multiprocessing.get_context('spawn')
+        self._executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=self._mp_context,
+            initializer=_init_worker,
+            initargs=(languages, gpu, model_directory, self.torch_threads)
+        )
+
+    def warmup(self):
+        """Démarrer tous les workers (et charger leurs Readers) sans attendre une requête"""
+        # Les workers sont créés à la demande: N tâches bloquées en même temps
+        # obligent le pool à démarrer ses N processus
+        with self._mp_context.Manager() as manager:
+            barrier = manager.Barrier(self.num_workers)
+            futures = [self._executor.submit(_wait_for_peers, barrier) for _ in range(self.num_workers)]
+            return sorted(future.result() for future in futures)
+
+    def submit_readtext(self, image, **params):
+        """Lancer reader.readtext dans un worker (retourne un Future)"""
+        return self._executor.submit(_readtext, image, params)
+
+    def readtext(self, image, **params):
+        """reader.readtext exécuté dans un worker"""
+        return self.submit_readtext(image, **params).result()
+
+    def readtext_batched(self, images, **params):
+        """reader.readtext_batched exécuté dans un worker"""
+        return self._executor.submit(_readtext_batched, images, params).result()
+
+    def detect(self, image, **params):
+        """reader.detect (détecteur seul) exécuté dans un worker"""
+        return self._executor.submit(_detect, image, params).result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
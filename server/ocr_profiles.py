@@ -0,0 +1,33 @@
+"""
+EdiScan - OCR Profiles
+Profils de paramètres de reader.readtext (quick, full, auto)
+"""
+
+# Profils de paramètres pour reader.readtext
+READTEXT_PROFILES = {
+    'quick': {
+        'paragraph': False,
+        'min_size': 20,
+        'text_threshold': 0.6,
+        'low_text': 0.3,
+        'link_threshold': 0.3,
+        'canvas_size': 1280,
+        'mag_ratio': 1.0
+    },
+    'full': {
+        'paragraph': False,
+        'min_size': 10,
+        'text_threshold': 0.7,
+        'low_text': 0.4,
+        'link_threshold': 0.4,
+        'canvas_size': 2560,
+        'mag_ratio': 1.5
+    },
+    # canvas_size, mag_ratio et min_size choisis par image (choose_auto_params)
+    'auto': {
+        'paragraph': False,
+        'text_threshold': 0.7,
+        'low_text': 0.4,
+        'link_threshold': 0.4
+    }
+}
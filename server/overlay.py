@@ -0,0 +1,44 @@
+"""
+EdiScan - Overlay
+Image des détections: boîtes colorées selon la confiance, sur un aperçu réduit
+"""
+
+import cv2
+import numpy as np
+
+from detections import Detections
+
+# Couleurs des boîtes par tranche de confiance (un appel de dessin par tranche)
+BOX_COLOR_BINS = 10
+
+
+def draw_boxes_on_image(image, detections, output_path, max_side=0):
+    """Dessiner les boîtes de détection sur l'image (tableau RGB déjà décodé)
+
+    L'image est d'abord réduite à max_side pixels (aperçu, 0 = pleine résolution);
+    les boîtes sont dessinées en un appel par tranche de confiance.
+    """
+    detections = Detections.from_results(detections)
+    height, width = image.shape[:2]
+    scale = min(1.0, max_side / max(height, width)) if max_side else 1.0
+    if scale < 1.0:
+        image = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    # Copie BGR pour le dessin et l'encodage: l'image décodée n'est pas modifiée
+    img = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+
+    boxes = np.rint(detections.boxes * scale).astype(np.int32)
+    confidences = detections.confidences
+    bins = np.clip((confidences * BOX_COLOR_BINS).astype(np.int32), 0, BOX_COLOR_BINS - 1)
+
+    for color_bin in np.unique(bins):
+        mask = bins == color_bin
+        # Couleur du milieu de la tranche: bleu (faible confiance) -> vert
+        level = (color_bin + 0.5) / BOX_COLOR_BINS
+        color = (int(255 * (1 - level)), int(255 * level), 0)
+        cv2.polylines(img, list(boxes[mask]), True, color, 2)
+        for pts, confidence in zip(boxes[mask], confidences[mask]):
+            cv2.putText(img, f"{int(confidence * 100)}%", (int(pts[0][0]), int(pts[0][1]) - 5),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+
+    cv2.imwrite(output_path, img)
+    return output_path
@@ -0,0 +1,200 @@
+"""
+EdiScan - Profiling
+Profilage à la demande d'une requête (cProfile ou échantillonnage des piles),
+réservé aux jetons autorisés côté serveur
+"""
+
+import cProfile
+import functools
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import Blueprint, abort, current_app, jsonify, make_response, request, send_from_directory, url_for
+
+from metrics import collect_stages
+
+# cprofile: appels de fonctions (.prof, pstats/snakeviz)
+# sampling: piles échantillonnées (.folded, flamegraph.pl/speedscope)
+PROFILING_MODES = ('cprofile', 'sampling')
+PROFILE_EXTENSIONS = {'cprofile': 'prof', 'sampling': 'folded'}
+PROFILE_FILENAME_PATTERN = re.compile(r'^[0-9a-f]{16}\.(prof|folded)$')
+
+# Demande de profilage: en-tête ou paramètre de requête portant un jeton autorisé
+PROFILE_HEADER = 'X-EdiScan-Profile'
+PROFILE_PARAM = 'profiling'
+
+profiling_bp = Blueprint('profiling', __name__)
+
+_tokens = ()
+_mode = 'cprofile'
+_sample_interval = 0.005
+_profiles_folder = os.path.abspath('profiles')
+_max_files = 50
+# Un seul profil à la fois (cProfile n'accepte qu'un profileur actif)
+_profile_lock = threading.Lock()
+
+
+def configure(tokens, mode='cprofile', profiles_folder='profiles', max_files=50, sample_interval_ms=5):
+    """Configurer les jetons autorisés (aucun = profilage désactivé) et le stockage des profils"""
+    global _tokens, _mode, _sample_interval, _profiles_folder, _max_files
+    _tokens = tuple(tokens)
+    _mode = mode
+    _sample_interval = sample_interval_ms / 1000
+    _profiles_folder = os.path.abspath(profiles_folder)
+    _max_files = max_files
+
+
+def is_enabled():
+    return bool(_tokens)
+
+
+def is_authorized():
+    """La requête porte-t-elle un jeton de profilage autorisé?"""
+    token = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_PARAM)
+    if not token:
+        return False
+    return any(hmac.compare_digest(token.encode(), allowed.encode()) for allowed in _tokens)
+
+
+class _StackSampler:
+    """Échantillonneur des piles d'un thread, agrégées au format « folded »"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def enable(self):
+        self._thread.start()
+
+    def disable(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump_stats(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _new_profiler():
+    if _mode == 'sampling':
+        return _StackSampler(threading.get_ident(), _sample_interval)
+    return cProfile.Profile()
+
+
+def _save_profile(profiler):
+    """Écrire le profil et ne garder que les _max_files plus récents"""
+    os.makedirs(_profiles_folder, exist_ok=True)
+    filename = f"{uuid.uuid4().hex[:16]}.{PROFILE_EXTENSIONS[_mode]}"
+    profiler.dump_stats(os.path.join(_profiles_folder, filename))
+
+    profiles = []
+    for name in os.listdir(_profiles_folder):
+        if PROFILE_FILENAME_PATTERN.match(name):
+            path = os.path.join(_profiles_folder, name)
+            try:
+                profiles.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+    profiles.sort(reverse=True)
+    for _, path in profiles[_max_files:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return filename
+
+
+def _attach_report(response, report):
+    """Temps par étape dans l'en-tête Server-Timing et, pour une réponse JSON, dans le corps"""
+    timings = [
+        f"{stage};dur={values['wall_seconds'] * 1000:.1f}"
+        for stage, values in report['stages'].items()
+    ]
+    timings.append(f"total;dur={report['wall_seconds'] * 1000:.1f}")
+    response.headers['Server-Timing'] = ', '.join(timings)
+    response.headers['X-EdiScan-Profile-Url'] = report['url']
+
+    payload = response.get_json(silent=True) if response.is_json else None
+    if isinstance(payload, dict):
+        payload['profiling'] = report
+        response.set_data(current_app.json.dumps(payload))
+
+
+def profiled(view):
+    """Profiler la vue quand la requête le demande avec un jeton autorisé
+
+    Seul le thread de la requête est profilé: l'OCR exécuté par les workers
+    du pool (OCR_WORKERS > 0) n'apparaît que par son attente.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_enabled() or not is_authorized():
+            return view(*args, **kwargs)
+        if not _profile_lock.acquire(blocking=False):
+            # Un profil est déjà en cours: requête servie sans profilage
+            return view(*args, **kwargs)
+        try:
+            with collect_stages() as stages:
+                profiler = _new_profiler()
+                start = time.perf_counter()
+                cpu_start = time.thread_time()
+                profiler.enable()
+                try:
+                    response = make_response(view(*args, **kwargs))
+                finally:
+                    profiler.disable()
+                    wall_seconds = time.perf_counter() - start
+                    cpu_seconds = time.thread_time() - cpu_start
+            filename = _save_profile(profiler)
+        finally:
+            _profile_lock.release()
+
+        report = {
+            'mode': _mode,
+            'url': url_for('profiling.download_profile', filename=filename),
+            'wall_seconds': round(wall_seconds, 6),
+            'cpu_seconds': round(cpu_seconds, 6),
+            'stages': {
+                stage: {
+                    'count': values['count'],
+                    'wall_seconds': round(values['wall_seconds'], 6),
+                    'cpu_seconds': round(values['cpu_seconds'], 6)
+                }
+                for stage, values in stages.items()
+            }
+        }
+        _attach_report(response, report)
+        return response
+
+    return wrapper
+
+
+@profiling_bp.route('/api/profiles/<filename>')
+def download_profile(filename):
+    """Télécharger un profil enregistré (même jeton que pour le demander)"""
+    if not is_enabled() or not is_authorized():
+        return jsonify({'error': 'Profilage non autorisé'}), 403
+    if not PROFILE_FILENAME_PATTERN.match(filename):
+        abort(404)
+    return send_from_directory(_profiles_folder, filename, as_attachment=True)
@@ -22,6 +22,7 @@ from features import (
     get_available_features,
     SUPPORTED_LANGUAGES
 )
+from profiling import profiled
 
 tools_bp = Blueprint('tools', __name__)
 
@@ -164,6 +165,7 @@ def tools_list():
 
 
 @tools_bp.route('/tool/<tool_id>', methods=['GET', 'POST'])
+@profiled
 def tool_page(tool_id):
     if tool_id not in TOOL_CONFIGS:
         return redirect(url_for('tools.tools_list'))
@@ -0,0 +1,173 @@
+"""
+EdiScan - Tiled OCR
+Découpage des grandes images en tuiles qui se chevauchent et fusion des détections
+"""
+
+import cv2
+import numpy as np
+
+# Une détection coupée par le bord d'une tuile est écartée si une détection
+# entière d'une autre tuile en recouvre au moins cette proportion
+CLIPPED_OVERLAP_RATIO = 0.3
+# Doublons restants (même texte vu entier par deux tuiles)
+DUPLICATE_IOU = 0.5
+# Tolérance (pixels) pour considérer qu'une boîte touche le bord d'une tuile
+EDGE_MARGIN = 2
+# Deux fragments coupés sont sur la même ligne si leurs hauteurs se recouvrent à ce point
+SAME_LINE_RATIO = 0.5
+# Lignes par bloc des matrices d'intersection (mémoire bornée sur les pages denses)
+INTERSECTION_BLOCK_ROWS = 256
+
+
+def make_tiles(height, width, tile_size, overlap):
+    """Rectangles (x0, y0, x1, y1) couvrant l'image, chevauchement de `overlap` pixels"""
+    step = max(1, tile_size - overlap)
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, step))
+        # Dernière tuile alignée sur le bord: pas de bande trop fine
+        positions.append(length - tile_size)
+        return positions
+
+    return [
+        (x0, y0, min(x0 + tile_size, width), min(y0 + tile_size, height))
+        for y0 in starts(height)
+        for x0 in starts(width)
+    ]
+
+
+def extract_tile(image, tile, tile_size):
+    """Tuile de l'image complétée en blanc jusqu'à tile_size (tuiles de même taille: OCR groupé)"""
+    x0, y0, x1, y1 = tile
+    crop = image[y0:y1, x0:x1]
+    pad_bottom = tile_size - crop.shape[0]
+    pad_right = tile_size - crop.shape[1]
+    if pad_bottom <= 0 and pad_right <= 0:
+        return crop
+    value = 255 if image.ndim == 2 else (255,) * image.shape[2]
+    return cv2.copyMakeBorder(crop, 0, max(0, pad_bottom), 0, max(0, pad_right), cv2.BORDER_CONSTANT, value=value)
+
+
+def _bounds(bbox):
+    points = np.asarray(bbox, dtype=np.float64)
+    return (float(points[:, 0].min()), float(points[:, 1].min()),
+            float(points[:, 0].max()), float(points[:, 1].max()))
+
+
+def _boxes_array(detections):
+    return np.array([d['box'] for d in detections], dtype=np.float64).reshape(-1, 4)
+
+
+def _intersections(boxes, others):
+    """Aires d'intersection de chaque boîte avec chacune des autres (len(boxes) x len(others))"""
+    width = np.minimum(boxes[:, None, 2], others[None, :, 2]) - np.maximum(boxes[:, None, 0], others[None, :, 0])
+    height = np.minimum(boxes[:, None, 3], others[None, :, 3]) - np.maximum(boxes[:, None, 1], others[None, :, 1])
+    return np.clip(width, 0, None) * np.clip(height, 0, None)
+
+
+def _areas(boxes):
+    return np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+
+
+def _join_text(left, right):
+    """Recoller deux fragments lus dans le chevauchement (suffixe de l'un = préfixe de l'autre)"""
+    for size in range(min(len(left), len(right)), 0, -1):
+        if left[-size:] == right[:size]:
+            return left + right[size:]
+    return f"{left} {right}"
+
+
+def _join_fragments(fragments):
+    """Réunir les fragments coupés d'une même ligne vus par des tuiles voisines"""
+    joined = []
+    # De gauche à droite: chaque fragment prolonge au plus une ligne déjà commencée
+    for fragment in sorted(fragments, key=lambda d: d['box'][0]):
+        b = fragment['box']
+        for index, previous in enumerate(joined):
+            a = previous['box']
+            overlap_y = min(a[3], b[3]) - max(a[1], b[1])
+            min_height = min(a[3] - a[1], b[3] - b[1]) or 1.0
+            if b[0] <= a[2] and overlap_y / min_height >= SAME_LINE_RATIO:
+                box = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                text = _join_text(previous['result'][1], fragment['result'][1])
+                confidence = min(previous['confidence'], fragment['confidence'])
+                points = [[box[0], box[1]], [box[2], box[1]], [box[2], box[3]], [box[0], box[3]]]
+                joined[index] = {
+                    'result': (points, text, confidence),
+                    'box': box,
+                    'clipped': True,
+                    'confidence': confidence
+                }
+                break
+        else:
+            joined.append(fragment)
+    return joined
+
+
+def merge_tile_detections(tile_results, tiles, height, width):
+    """Fusionner les détections des tuiles dans le repère de l'image complète
+
+    tile_results: résultats readtext par tuile (repère de la tuile).
+    Les doublons des zones de chevauchement sont retirés: une détection coupée
+    par un bord intérieur cède la place à la détection entière d'une tuile
+    voisine, puis les doublons entiers sont réduits à la plus confiante.
+    """
+    detections = []
+    for (x0, y0, x1, y1), results in zip(tiles, tile_results):
+        for (bbox, text, confidence) in results:
+            points = [[float(p[0]) + x0, float(p[1]) + y0] for p in bbox]
+            box = _bounds(points)
+            # Coupée si elle touche un bord de tuile qui n'est pas un bord de l'image
+            clipped = (
+                (x0 > 0 and box[0] <= x0 + EDGE_MARGIN)
+                or (y0 > 0 and box[1] <= y0 + EDGE_MARGIN)
+                or (x1 < width and box[2] >= x1 - EDGE_MARGIN)
+                or (y1 < height and box[3] >= y1 - EDGE_MARGIN)
+            )
+            detections.append({
+                'result': (points, text, confidence),
+                'box': box,
+                'clipped': clipped,
+                'confidence': float(confidence)
+            })
+
+    whole = [d for d in detections if not d['clipped']]
+    clipped = [d for d in detections if d['clipped']]
+    fragments = []
+    if clipped:
+        clipped_boxes = _boxes_array(clipped)
+        covered = np.zeros(len(clipped))
+        if whole:
+            whole_boxes = _boxes_array(whole)
+            for start in range(0, len(clipped), INTERSECTION_BLOCK_ROWS):
+                block = clipped_boxes[start:start + INTERSECTION_BLOCK_ROWS]
+                covered[start:start + len(block)] = _intersections(block, whole_boxes).max(axis=1)
+        areas = _areas(clipped_boxes)
+        areas[areas == 0] = 1.0
+        # Aucune tuile ne voit ce texte en entier: on garde le fragment
+        fragments = [d for d, alone in zip(clipped, covered / areas < CLIPPED_OVERLAP_RATIO) if alone]
+    kept = whole + _join_fragments(fragments)
+    if not kept:
+        return []
+
+    # Doublons entiers: le plus confiant d'abord. Seules les boîtes d'une zone
+    # de chevauchement (au moins deux tuiles) peuvent avoir été vues deux fois
+    kept.sort(key=lambda d: d['confidence'], reverse=True)
+    boxes = _boxes_array(kept)
+    areas = _areas(boxes)
+    tile_boxes = np.array(tiles, dtype=np.float64).reshape(-1, 4)
+    candidates = np.flatnonzero((_intersections(boxes, tile_boxes) > 0).sum(axis=1) >= 2)
+    keep = np.ones(len(kept), dtype=bool)
+    for position, index in enumerate(candidates):
+        if not keep[index]:
+            continue
+        others = candidates[position + 1:]
+        others = others[keep[others]]
+        inter = _intersections(boxes[index:index + 1], boxes[others])[0]
+        union = areas[index] + areas[others] - inter
+        iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+        keep[others[iou > DUPLICATE_IOU]] = False
+
+    return [d['result'] for d, kept_detection in zip(kept, keep) if kept_detection]
@@ -0,0 +1,53 @@
+"""
+EdiScan - Uploads
+Hash du contenu calculé pendant la réception des fichiers
+"""
+
+import hashlib
+
+from flask import Request
+
+# Même algorithme que calculate_image_hash (history.image_hash, clés du cache)
+UPLOAD_HASH_ALGORITHM = 'md5'
+
+
+class HashingStream:
+    """Fichier temporaire d'upload qui hache les données au fil de l'écriture"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._hasher = hashlib.new(UPLOAD_HASH_ALGORITHM)
+
+    def write(self, data):
+        self._hasher.update(data)
+        return self._stream.write(data)
+
+    def hexdigest(self):
+        return self._hasher.hexdigest()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def __iter__(self):
+        return iter(self._stream)
+
+
+class HashingRequest(Request):
+    """Requête Flask dont les fichiers reçus sont hachés pendant le parsing"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        stream = super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return HashingStream(stream)
+
+
+def get_upload_hash(file):
+    """Hash du contenu d'un FileStorage, sans relire le fichier si possible"""
+    if isinstance(file.stream, HashingStream):
+        return file.stream.hexdigest()
+
+    # Flux non instrumenté: lecture par blocs puis retour au début
+    hasher = hashlib.new(UPLOAD_HASH_ALGORITHM)
+    for chunk in iter(lambda: file.stream.read(8192), b''):
+        hasher.update(chunk)
+    file.stream.seek(0)
+    return hasher.hexdigest()